@@ -0,0 +1,208 @@
+# answer_sampler.py
+#
+# Backtracking sampler for candidate answers: exactly 3 circles in every container of a layout
+# (rows, cols, blocks and any extra containers).
+#
+# Cells and containers are bitmasks over the 81 cells.  Like the old rejection sampler, circles
+# are placed on randomly chosen open cells, but after each placement the per-container remaining
+# capacities are forward checked: a container with no circles left to place closes its open cells,
+# a container with exactly as many open cells as circles left gets them all, and a container with
+# too few open cells is a dead end which backtracks one choice, rather than restarting the grid.
+# The search time is heavy tailed on jigsaw layouts, so each search has a small node budget, and
+# is restarted (with new random choices) when it runs out.
+#
+# find_witness() decides whether a layout (e.g. jigsaw plus extra containers) has any answer at all.
+# A few random searches almost always find one; failing that, the search is run exhaustively,
+# branching on the tightest container, with extra propagation between pairs of overlapping containers.
+
+import random
+
+CIRCLES_PER_CONTAINER = 3
+RESTART_NODES = 1000
+MAX_RESTARTS = 50
+WITNESS_RESTARTS = 10
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+def mask_cells(mask):
+    """Return the list of cell addresses set in mask."""
+    cells = []
+    addr = 0
+    while mask:
+        if mask & 1:
+            cells.append(addr)
+        mask >>= 1
+        addr += 1
+    return cells
+
+class AnswerSampler():
+    def __init__(self, layout, per_container=CIRCLES_PER_CONTAINER):
+        num_symbols = layout.num_symbols
+        self.area = layout.area
+        self.per_container = per_container
+        self.container_masks = [sum(1 << (cy*num_symbols+cx) for cx,cy in cont) for cont in layout.containers]
+        self.cell_containers = [[ci for ci,cmask in enumerate(self.container_masks) if (cmask >> addr) & 1] for addr in range(self.area)]
+        # pairs of overlapping containers, for the exact search's extra propagation
+        self.container_pairs = [(ci, cj) for ci in range(len(self.container_masks)) for cj in range(ci+1, len(self.container_masks))
+                                if self.container_masks[ci] & self.container_masks[cj]]
+        self.nodes = 0
+        self.max_nodes = None
+        self.exact = False
+
+    def choose_cell(self, open_cells, remaining, rng):
+        if not self.exact:
+            return rng.choice(mask_cells(open_cells))
+        # fail first: the first open cell of the container with the fewest spare open cells
+        best_mask = 0
+        best_spare = None
+        for ci,cmask in enumerate(self.container_masks):
+            avail = open_cells & cmask
+            if avail:
+                spare = popcount(avail) - remaining[ci]
+                if best_spare is None or spare < best_spare:
+                    best_spare = spare
+                    best_mask = avail
+        return (best_mask & -best_mask).bit_length() - 1
+
+    def propagate(self, open_cells, circles, remaining):
+        """
+        Forward check the remaining capacities until nothing changes.  remaining is updated in place.
+
+        Returns:
+            (open_cells, circles), or None at a dead end
+        """
+        changed = True
+        while changed:
+            changed = False
+            for ci,cmask in enumerate(self.container_masks):
+                need = remaining[ci]
+                avail = open_cells & cmask
+                if need == 0:
+                    if avail:
+                        open_cells &= ~avail
+                        changed = True
+                    continue
+                nbr_avail = popcount(avail)
+                if nbr_avail < need:
+                    return None
+                if nbr_avail == need:
+                    # every open cell in this container must be a circle
+                    open_cells &= ~avail
+                    circles |= avail
+                    if not self.place_circles(avail, remaining):
+                        return None
+                    changed = True
+            if not changed and self.exact:
+                state = self.propagate_pairs(open_cells, circles, remaining)
+                if state is None:
+                    return None
+                changed = state != (open_cells, circles)
+                open_cells, circles = state
+        return open_cells, circles
+
+    def place_circles(self, mask, remaining):
+        """Count circles placed on the cells in mask against their containers; False if one overflows."""
+        for addr in mask_cells(mask):
+            for cj in self.cell_containers[addr]:
+                remaining[cj] -= 1
+                if remaining[cj] < 0:
+                    return False
+        return True
+
+    def propagate_pairs(self, open_cells, circles, remaining):
+        """
+        For each pair of overlapping containers A and B, the circles still to go in their open overlap
+        are bounded by what A and B each need, and by how much room each has outside the overlap.
+        Fills or closes whatever those bounds force.
+
+        Returns:
+            (open_cells, circles), or None at a dead end
+        """
+        for ci,cj in self.container_pairs:
+            avail_a = open_cells & self.container_masks[ci]
+            avail_b = open_cells & self.container_masks[cj]
+            both = avail_a & avail_b
+            if not both:
+                continue
+            only_a = avail_a & ~both
+            only_b = avail_b & ~both
+            need_a = remaining[ci]
+            need_b = remaining[cj]
+            nbr_both = popcount(both)
+            low = max(0, need_a - popcount(only_a), need_b - popcount(only_b))
+            high = min(nbr_both, need_a, need_b)
+            if low > high:
+                return None
+            # the overlap takes low..high circles, and each side the rest of its container's need
+            for area_mask, most, least in ((both, high, low), (only_a, need_a - low, need_a - high), (only_b, need_b - low, need_b - high)):
+                if not area_mask:
+                    continue
+                if most == 0:
+                    open_cells &= ~area_mask
+                elif least == popcount(area_mask):
+                    open_cells &= ~area_mask
+                    circles |= area_mask
+                    if not self.place_circles(area_mask, remaining):
+                        return None
+        return open_cells, circles
+
+    def search(self, open_cells, circles, remaining, rng):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            return None
+        state = self.propagate(open_cells, circles, remaining)
+        if state is None:
+            return None
+        open_cells, circles = state
+        if not open_cells:
+            # propagation guarantees every container is exactly full here
+            return circles
+
+        addr = self.choose_cell(open_cells, remaining, rng)
+        bit = 1 << addr
+
+        # place a circle on the chosen cell...
+        placed_remaining = remaining.copy()
+        for ci in self.cell_containers[addr]:
+            placed_remaining[ci] -= 1
+        result = self.search(open_cells & ~bit, circles | bit, placed_remaining, rng)
+        if result is not None or (self.max_nodes is not None and self.nodes > self.max_nodes):
+            return result
+
+        # ...or, if that led nowhere, leave it empty
+        return self.search(open_cells & ~bit, circles, remaining.copy(), rng)
+
+    def find_witness(self, rng=random):
+        """
+        Return an answer (list of 'O' and '.' characters) if the layout has any, or None if it has none.
+        """
+        answer = self.sample(rng, max_restarts=WITNESS_RESTARTS)
+        if answer is not None:
+            return answer
+
+        self.nodes = 0
+        self.max_nodes = None
+        self.exact = True
+        remaining = [self.per_container] * len(self.container_masks)
+        try:
+            circles = self.search((1 << self.area) - 1, 0, remaining, None)
+        finally:
+            self.exact = False
+        if circles is None:
+            return None
+        return ['O' if (circles >> addr) & 1 else '.' for addr in range(self.area)]
+
+    def sample(self, rng=random, restart_nodes=RESTART_NODES, max_restarts=MAX_RESTARTS):
+        """
+        Return a random answer as a list of 'O' and '.' characters, or None if none was found
+        in max_restarts searches of restart_nodes search nodes each.
+        """
+        for restart in range(max_restarts):
+            self.nodes = 0
+            self.max_nodes = restart_nodes
+            remaining = [self.per_container] * len(self.container_masks)
+            circles = self.search((1 << self.area) - 1, 0, remaining, rng)
+            if circles is not None:
+                return ['O' if (circles >> addr) & 1 else '.' for addr in range(self.area)]
+        return None
@@ -0,0 +1,42 @@
+# batch_clues.py
+#
+# Batched (numpy) clue computation for many candidate answers at once.  Answers are a (K, 9, 9)
+# uint8 array with 1 for circles; each cell's clue is the sum of the 8 shifted copies of the
+# zero-padded answers, i.e. a 3x3 box filter minus the centre, computed for the whole batch in one pass.
+
+import numpy as np
+
+def answers_to_array(answers):
+    """Convert a list of answers (strings or lists of 'O' and '.', row-major) to a (K, n, n) uint8 array."""
+    n = int(round(len(answers[0]) ** 0.5))
+    flat = np.array([[c == 'O' for c in answer] for answer in answers], dtype=np.uint8)
+    return flat.reshape(len(answers), n, n)
+
+def neighbour_counts(answers_array):
+    """Return a (K, n, n) uint8 array with the number of circles around each cell."""
+    k, h, w = answers_array.shape
+    padded = np.zeros((k, h+2, w+2), dtype=np.uint8)
+    padded[:, 1:-1, 1:-1] = answers_array
+    counts = np.zeros((k, h, w), dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy == 1 and dx == 1:
+                continue
+            counts += padded[:, dy:dy+h, dx:dx+w]
+    return counts
+
+def clue_strings(answers_array, allow_zeros=False):
+    """
+    Return the fully clued puzzle string for each answer, matching PuzzleRecord.setup_initial_clues:
+    '.' on circles (and on zeros, unless allow_zeros), and the neighbour count elsewhere.
+    """
+    counts = neighbour_counts(answers_array)
+    # map each cell to an ascii code, then slice the whole batch into strings
+    codes = counts.astype(np.uint8) + ord('0')
+    codes[answers_array != 0] = ord('.')
+    if not allow_zeros:
+        codes[(counts == 0) & (answers_array == 0)] = ord('.')
+    k = codes.shape[0]
+    area = codes.shape[1] * codes.shape[2]
+    data = codes.reshape(k * area).tobytes().decode('ascii')
+    return [data[i*area:(i+1)*area] for i in range(k)]
@@ -0,0 +1,138 @@
+# classic_answers.py
+#
+# Exact counting, uniform sampling, and ranking/unranking of classic (lime) answer grids:
+# 3 circles in every row, column and 3x3 block, with no other constraints.
+#
+# Each row is one of the 84 patterns with 3 circles.  A band (3 rows of blocks) is 3 row patterns
+# which put 3 circles in each of its blocks; there are 69261 of them, grouped by the 1000 possible
+# column-count vectors they produce.  An answer is 3 bands whose column counts add up to 3 in
+# every column, so the answers can be counted (and indexed) over pairs of column-count vectors.
+#
+# Column-count vectors are stored as octal digit strings (one digit per column), so adding two
+# vectors never carries, and a sum is within the column limits iff no digit has its 4 bit set.
+#
+# python classic_answers.py          # print the number of answers
+# python classic_answers.py 12345    # print answer number 12345
+
+import itertools
+import math
+import random
+
+FULL_COLUMNS = int('3' * 9, 8)
+OVER_COLUMNS = int('4' * 9, 8)
+
+def row_block_counts(pattern):
+    return tuple(bin((pattern >> (3*b)) & 7).count('1') for b in range(3))
+
+def row_column_vector(pattern):
+    return sum(8**x for x in range(9) if (pattern >> x) & 1)
+
+class ClassicAnswers():
+    def __init__(self):
+        self.row_patterns = [sum(1 << x for x in cols) for cols in itertools.combinations(range(9), 3)]
+        by_block_counts = {}
+        for pattern in self.row_patterns:
+            by_block_counts.setdefault(row_block_counts(pattern), []).append(pattern)
+
+        # band lists, keyed by column-count vector
+        self.bands = {}
+        for top in self.row_patterns:
+            top_counts = row_block_counts(top)
+            for middle in self.row_patterns:
+                counts = [t + m for t,m in zip(top_counts, row_block_counts(middle))]
+                if max(counts) > 3 or sum(counts) != 6:
+                    continue
+                # the bottom row has to fill each block up to 3
+                for bottom in by_block_counts.get(tuple(3 - c for c in counts), []):
+                    vector = row_column_vector(top) + row_column_vector(middle) + row_column_vector(bottom)
+                    self.bands.setdefault(vector, []).append((top, middle, bottom))
+        self.vectors = sorted(self.bands)
+        self.band_counts = {vector: len(self.bands[vector]) for vector in self.vectors}
+        self.band_index = None # (top, middle, bottom) -> index in its band list, built on first rank()
+
+        # number of ways to complete the grid below a top band with each column-count vector
+        self.completions = {}
+        for v1 in self.vectors:
+            total = 0
+            for v2 in self.vectors:
+                s = v1 + v2
+                if s & OVER_COLUMNS:
+                    continue
+                total += self.band_counts[v2] * self.band_counts.get(FULL_COLUMNS - s, 0)
+            self.completions[v1] = total
+        self.total = sum(self.band_counts[v1] * self.completions[v1] for v1 in self.vectors)
+
+    def __len__(self):
+        return self.total
+
+    def unrank(self, index):
+        """Return answer number index (0 <= index < total) as a list of 'O' and '.' characters."""
+        if not 0 <= index < self.total:
+            raise IndexError(f"answer index {index} out of range")
+        for v1 in self.vectors:
+            weight = self.band_counts[v1] * self.completions[v1]
+            if index < weight:
+                break
+            index -= weight
+        band1, index = divmod(index, self.completions[v1])
+        for v2 in self.vectors:
+            s = v1 + v2
+            if s & OVER_COLUMNS:
+                continue
+            v3 = FULL_COLUMNS - s
+            weight = self.band_counts[v2] * self.band_counts.get(v3, 0)
+            if index < weight:
+                break
+            index -= weight
+        band2, band3 = divmod(index, self.band_counts[v3])
+        rows = self.bands[v1][band1] + self.bands[v2][band2] + self.bands[v3][band3]
+        return ['O' if (pattern >> x) & 1 else '.' for pattern in rows for x in range(9)]
+
+    def rank(self, answer):
+        """Return the index of an answer (a string or list of 'O' and '.' characters)."""
+        if self.band_index is None:
+            self.band_index = {band: i for vector in self.vectors for i,band in enumerate(self.bands[vector])}
+        rows = [sum(1 << x for x in range(9) if answer[y*9+x] == 'O') for y in range(9)]
+        bands = [tuple(rows[0:3]), tuple(rows[3:6]), tuple(rows[6:9])]
+        if any(band not in self.band_index for band in bands):
+            raise ValueError("not a classic answer")
+        v1, v2, v3 = [sum(row_column_vector(pattern) for pattern in band) for band in bands]
+        if v1 + v2 + v3 != FULL_COLUMNS:
+            raise ValueError("not a classic answer")
+
+        index = 0
+        for v in self.vectors:
+            if v == v1:
+                break
+            index += self.band_counts[v] * self.completions[v]
+        index += self.band_index[bands[0]] * self.completions[v1]
+        for v in self.vectors:
+            if v == v2:
+                break
+            s = v1 + v
+            if not s & OVER_COLUMNS:
+                index += self.band_counts[v] * self.band_counts.get(FULL_COLUMNS - s, 0)
+        return index + self.band_index[bands[1]] * self.band_counts[v3] + self.band_index[bands[2]]
+
+    def stride(self):
+        """
+        A large step coprime with the number of answers, so index, index+stride, index+2*stride...
+        (mod total) visits every answer once, without neighbouring answers being too similar.
+        """
+        step = int(self.total * 0.6180339887)
+        while math.gcd(step, self.total) != 1:
+            step += 1
+        return step
+
+    def sample(self, rng=random):
+        """Return a uniformly random answer."""
+        return self.unrank(rng.randrange(self.total))
+
+if __name__ == "__main__":
+    import sys
+
+    answers = ClassicAnswers()
+    if len(sys.argv) > 1:
+        print(''.join(answers.unrank(int(sys.argv[1]))))
+    else:
+        print(f"{answers.total} classic answers")
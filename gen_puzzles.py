@@ -6,12 +6,20 @@ Puzzle generator for Lime Sudoku puzzles.
 
 import argparse
 import importlib
+import os
+import sys
 import time
 # from solve_OR import solve as solve_OR # use this for initializing random answers
 from puzzle_record import PuzzleRecord
 from layout_classic import Layout as ClassicLayout
 from layout_jiggy9 import Layout as JiggyLayout
 from draw_limesudoku import draw_puzzle
+from puzzle_pool import PuzzlePool, pool_options
+from difficulty_predictor import DifficultyPredictor
+from classic_answers import ClassicAnswers
+from answer_sampler import AnswerSampler
+from layout_bank import LayoutBank
+import solve_BM
 
 parser = argparse.ArgumentParser(description='Generate Lime Sudoku puzzles')
 parser.add_argument('-n', '--number', type=int, default=1,
@@ -22,7 +30,7 @@ parser.add_argument('-z', '--allow_zeros', action='store_true',
                     help='Allow zero clues (default: False)')
 parser.add_argument('-dc', '--draw_candidates', action='store_true',
                     help='Draw candidate puzzles as images during generation (default: False)')
-parser.add_argument('-s', '--solver', type=str, default='PR', choices=['OR', 'PR'], 
+parser.add_argument('-s', '--solver', type=str, default='PR', choices=['OR', 'PR', 'BM'], 
                     help='Solver to use (%(choices)s) (default: %(default)s)')
 parser.add_argument('-v', '--verbose', action='store_true', 
                     help='Verbose output')
@@ -38,6 +46,44 @@ parser.add_argument('-maxc', '--max_clues', type=int, default=15,
                     help='Maximum number of clues allowed in generated puzzles (no default)')
 parser.add_argument('-rp', '--reduction_passes', type=int, default=3,
                     help='Number of reduction passes during puzzle refinement (default: %(default)s)')
+parser.add_argument('-ap', '--adaptive_passes', action='store_true',
+                    help='Keep running reduction passes until --max_clues is reached, or --max_reduction_passes have been run (default: False)')
+parser.add_argument('-mrp', '--max_reduction_passes', type=int, default=10,
+                    help='Pass budget for --adaptive_passes (default: %(default)s)')
+parser.add_argument('-ea', '--emit_all', action='store_true',
+                    help='Keep every distinct minimal puzzle found by the reduction passes, not just the one with fewest clues (default: False)')
+parser.add_argument('-so', '--side_output', type=str,
+                    help='File to append valid puzzles outside the requested tiers to, rather than discarding them (default: none)')
+parser.add_argument('-pool', '--pool_dir', type=str,
+                    help='Directory of a persistent puzzle pool, bucketed by type, tier, -z and the max tier puzzles were refined with.  Valid puzzles outside the requested tiers are added to it, and puzzles refined with the same or a higher max tier are drawn from it before generating new ones (default: none)')
+parser.add_argument('-mt', '--multi_tier', action='store_true',
+                    help='Refine each candidate into a tier-1, tier-2 and tier-3 puzzle, each tier starting from the clues of the one before (default: False)')
+parser.add_argument('-st', '--steer_tier', action='store_true',
+                    help='Steer clue removal towards puzzles of at least --min_tier, and abandon passes which clearly won\'t get there (PR solver only) (default: False)')
+parser.add_argument('-sw', '--steer_width', type=int, default=3,
+                    help='Number of candidate removals compared at each step of a steered pass (default: %(default)s)')
+parser.add_argument('-sg', '--steer_giveup', type=int, default=4,
+                    help='Abandon a steered pass when fewer than this many untried clues remain per tier still needed (default: %(default)s)')
+parser.add_argument('-va', '--variant_aware', action='store_true',
+                    help='For diagonals, windows and centerdot puzzles, track during reduction whether the extra containers have become necessary, and abandon passes where they can\'t (default: False)')
+parser.add_argument('-sm', '--salvage_moves', type=int, default=0,
+                    help='Budget of local search moves used to bring refined puzzles with too many clues within --max_clues (default: %(default)s, no salvage)')
+parser.add_argument('-pm', '--predictor', type=str,
+                    help='Difficulty predictor model (see difficulty_predictor.py), used to skip candidates unlikely to refine to the requested tiers')
+parser.add_argument('-pth', '--predictor_threshold', type=float, default=0.0,
+                    help='Skip candidates whose predicted probability of being in tier is below this (default: %(default)s, never skip, just report)')
+parser.add_argument('-ua', '--uniform_answers', action='store_true',
+                    help='Draw candidate answers uniformly from all classic answers (lime puzzle type only)')
+parser.add_argument('-ai', '--answer_index', type=int,
+                    help='Use classic answers from this index on, stepping by a fixed stride, for reproducible books (lime puzzle type only)')
+parser.add_argument('-bs', '--batch_size', type=int, default=1,
+                    help='Generate candidates in batches of this size, with their clues computed together (needs numpy, not used for jigsaw or -ai) (default: %(default)s)')
+parser.add_argument('-lb', '--layout_bank', type=str,
+                    help='Draw jigsaw layouts from a bank of pre-checked layouts (see layout_bank.py) instead of making new ones')
+parser.add_argument('-pf', '--prefilter', action='store_true',
+                    help='Check clue removals for uniqueness with the fast exact counter (solve_BM), and skip the solve for ambiguous ones')
+parser.add_argument('-rm', '--refine_mode', type=str, default='reduce', choices=['reduce', 'construct'],
+                    help='Refinement mode: remove clues from the fully-clued candidate, or add clues to an empty grid (%(choices)s) (default: %(default)s)')
 parser.add_argument('-o', '--output_file', type=str,
                     help='Output file to write puzzles to (default: stdout)')
 parser.add_argument('-sort', '--sort_by', type=str,
@@ -53,29 +99,207 @@ if args.very_verbose:
     args.verbose = True
 
 if args.sort_by is None:
-    args.sort_by = 'none' if args.solver == 'OR' else 'work'
+    args.sort_by = 'none' if args.solver in ('OR', 'BM') else 'work'
 
 solver_module = importlib.import_module(f'solve_{args.solver}')
 solve = solver_module.solve
+if args.solver == 'OR':
+    # candidates always carry their answer, so uniqueness only needs a check for any other solution
+    def solve(puzzle_rec, options={}):
+        return solver_module.solve(puzzle_rec, dict(options, known_answer=True))
+
+if args.refine_mode == 'construct' and args.solver != 'PR':
+    print("ERROR: construct refinement is only supported for PR solver")
+    sys.exit(1)
+
+if (args.uniform_answers or args.answer_index is not None) and args.puzzle_type != 'lime':
+    print("ERROR: uniform/indexed answers are only supported for the lime puzzle type")
+    sys.exit(1)
+
+layout_bank = LayoutBank(args.layout_bank) if args.layout_bank else None
+if layout_bank and layout_bank.puzzle_type != args.puzzle_type:
+    print(f"ERROR: layout bank is for {layout_bank.puzzle_type} puzzles, not {args.puzzle_type}")
+    sys.exit(1)
+
+if args.steer_tier and args.solver != 'PR':
+    print("ERROR: tier steering is only supported for PR solver")
+    sys.exit(1)
 
 layout_module = JiggyLayout if 'jig' in args.puzzle_type else ClassicLayout
 
-def refine_puzzle(puzzle_rec):
+def reduction_target_met(min_clues):
+    """
+    With --adaptive_passes, refinement stops as soon as the puzzle has few enough clues.
+    """
+    return args.adaptive_passes and args.max_clues is not None and min_clues <= args.max_clues
+
+def prune_limit(min_clues):
+    """
+    Clue count which a refinement pass must get below to be worth finishing.  With --emit_all,
+    every pass that could still meet --max_clues is kept, not just the best one.
+    """
+    if args.emit_all or args.steer_tier:
+        return args.max_clues + 1 if args.max_clues is not None else 82
+    return min_clues
+
+def refinement_results(best_puzzle, pass_results):
+    """
+    The puzzles refinement hands back to the generator, fewest clues first.  An empty list if
+    every pass was pruned or abandoned, since best_puzzle is then still the unrefined candidate.
+    """
+    if not pass_results:
+        return []
+    if args.emit_all:
+        return sorted(pass_results.values(), key=lambda prec: sum(1 for c in prec.clues_string if c != '.'))
+    return [best_puzzle]
+
+def is_variant_type(puzzle_type):
+    return 'diagonals' in puzzle_type or 'windows' in puzzle_type or 'centerdot' in puzzle_type
+
+class VariantTracker():
+    """
+    Tracks, during a reduction pass, whether a variant puzzle's extra containers (diagonals, 
+    windows, centerdot) can still become necessary.  Removing clues only loses information, so
+    if the clues already known to be necessary can solve the puzzle without the extra containers,
+    so can the final puzzle, and the pass can be abandoned.
+    """
+    def __init__(self, puzzle_rec, max_tier):
+        self.active = args.variant_aware and is_variant_type(puzzle_rec.puzzle_type)
+        self.max_tier = max_tier
+        self.kept_positions = set()
+        self.extra_cells = set()
+        if self.active:
+            for cont in puzzle_rec.layout.containers[27:]:
+                self.extra_cells.update(cont)
+
+    def order(self, positions):
+        """
+        Try first the clues which overlap the extra containers most, since removing them makes
+        the extra containers do more of the work.
+        """
+        if not self.active:
+            return positions
+        def overlap(pos):
+            x,y = pos % 9, pos // 9
+            return sum(1 for dx in (-1,0,1) for dy in (-1,0,1) if (x+dx,y+dy) in self.extra_cells)
+        return sorted(positions, key=overlap, reverse=True) # stable, so otherwise still shuffled
+
+    def removal_failed(self, current_puzzle, pos):
+        """
+        Returns True if the pass can no longer produce a puzzle that needs its extra containers.
+        """
+        if not self.active:
+            return False
+        self.kept_positions.add(pos)
+        kept_puzzle = current_puzzle.clone()
+        kept_puzzle.clues_string = ''.join(c if addr in self.kept_positions else '.' for addr,c in enumerate(current_puzzle.clues_string))
+        # the refinement tier is enough here, and much cheaper than the full check, since it can only 
+        # solve puzzles which the full check would solve too
+        if extra_containers_ignorable(kept_puzzle, max_tier=self.max_tier):
+            if args.very_verbose:
+                print(f"necessary clues solve without extra containers, abandoning pass")
+            return True
+        return False
+
+prefilter_stats = {'checks': 0, 'saved': 0}
+
+def removal_solve(test_puzzle, options):
+    """
+    Solve a puzzle which has just had a clue removed.  With --prefilter, an exact solution count
+    comes first: a puzzle with more than one solution can't be solved, so the (much slower) solve 
+    is skipped, and this returns "multiple solutions" with no stats.
+    """
+    if args.prefilter:
+        prefilter_stats['checks'] += 1
+        if solve_BM.count_solutions(test_puzzle, 2)[0] > 1:
+            prefilter_stats['saved'] += 1
+            return "multiple solutions", None
+    return solve(test_puzzle, options=options)
+
+def steer_score(stats, rule_tiers):
+    """
+    How far a solve was pushed towards the harder rules: its max tier, then the number of 
+    steps taken with tier-2+ rules, then total work.
+    """
+    logic_history = stats['logic_history'].split(',') if stats['logic_history'] else []
+    hard_steps = sum(1 for shortnom in logic_history if rule_tiers[shortnom] >= 2)
+    return (stats['mta'], hard_steps, stats['work'])
+
+def steered_reduction_pass(current_puzzle, positions, current_clues, min_clues, max_tier, target_tier, variant_tracker):
+    """
+    A reduction pass which, at each step, tries removing the next few untried clues and keeps
+    the removal that pushes the solve furthest towards the harder rules.  Clues whose removal
+    fails are necessary, and are dropped from consideration; the other candidates are tried
+    again at a later step.  The pass is abandoned once the target tier is clearly out of reach.
+
+    Returns:
+        (refined puzzle record, clue count, True if the pass was abandoned)
+    """
+    rule_tiers = {rule['shortnom']:rule['tier'] for rule in solver_module.production_rules}
+    untried = [pos for pos in positions if current_puzzle.clues_string[pos] != '.']
+    mta = 0
+    while untried:
+        # Bound: even if every untried clue could be removed, this pass can't beat the best so far
+        if current_clues - len(untried) >= prune_limit(min_clues):
+            return current_puzzle, current_clues, True
+        if mta < target_tier and len(untried) < args.steer_giveup * (target_tier - mta):
+            if args.very_verbose:
+                print(f"steered pass abandoned at tier {mta}, with {len(untried)} untried clues")
+            return current_puzzle, current_clues, True
+
+        best_pos = None
+        for pos in untried[:args.steer_width]:
+            test_puzzle = current_puzzle.clone()
+            test_puzzle.change_clue(pos, '.')
+            if args.very_verbose:
+                print('solving ',test_puzzle.clues_string)
+            result,stats = removal_solve(test_puzzle, {'max_tier':max_tier, 'verbose': args.verbose, 'very_verbose': args.very_verbose})
+            if len(result) != 81:
+                untried.remove(pos)
+                if variant_tracker.removal_failed(current_puzzle, pos):
+                    return current_puzzle, current_clues, True
+                continue
+            score = steer_score(stats, rule_tiers)
+            if best_pos is None or score > best_score:
+                best_pos,best_score,best_puzzle = pos,score,test_puzzle
+
+        if best_pos is not None:
+            untried.remove(best_pos)
+            current_puzzle = best_puzzle
+            current_clues -= 1
+            mta = best_score[0]
+    return current_puzzle, current_clues, False
+
+def refine_puzzle(puzzle_rec, max_tier=None, target_tier=None):
     """
-    Refine the puzzle by removing unnecessary clues through 3 refinement passes.
+    Refine the puzzle by removing unnecessary clues through multiple refinement passes.
+    A pass is abandoned as soon as it can no longer beat the best puzzle found so far.
     
     Args:
         fully_clued_puzzle: 81-character string with all clues
+        max_tier: maximum tier of rules for the solver (default: --max_tier)
+        target_tier: tier to steer towards, with --steer_tier (default: --min_tier)
         
     Returns:
-        Refined puzzle string with minimal necessary clues
+        List of refined puzzle records with minimal necessary clues (just the best one, unless --emit_all)
     """
     import random
     
+    if max_tier is None:
+        max_tier = args.max_tier
+    if target_tier is None:
+        target_tier = args.min_tier
+    steering = args.steer_tier and target_tier > 1
     best_puzzle = puzzle_rec.clone()
-    min_clues = sum(1 for c in puzzle_rec.clues_string if c != '.')
+    full_clues = sum(1 for c in puzzle_rec.clues_string if c != '.')
+    min_clues = full_clues
+    pass_results = {} # distinct minimal puzzles, keyed by clues string
+
+    nbr_passes = args.max_reduction_passes if args.adaptive_passes else args.reduction_passes
+    for pass_num in range(nbr_passes):
+        if reduction_target_met(min_clues):
+            break
 
-    for pass_num in range(args.reduction_passes):
         # Start with the fully clued puzzle
         current_puzzle = puzzle_rec.clone()
         last_stats = None
@@ -83,29 +307,58 @@ def refine_puzzle(puzzle_rec):
         # Create shuffled list of all positions
         positions = list(range(81))
         random.shuffle(positions)
+        variant_tracker = VariantTracker(puzzle_rec, max_tier)
+        positions = variant_tracker.order(positions)
+
+        current_clues = full_clues
+        untried_clues = current_clues
+        pruned = False
         
-        # Try removing each clue one by one
-        for pos in positions:
-            test_puzzle = current_puzzle.clone()
-            if test_puzzle.clues_string[pos] == '.':
-                continue  # Skip positions that are already empty
+        if steering:
+            current_puzzle,current_clues,pruned = steered_reduction_pass(current_puzzle, positions, current_clues, min_clues, max_tier, target_tier, variant_tracker)
+        else:
+            # Try removing each clue one by one
+            for pos in positions:
+                if current_puzzle.clues_string[pos] == '.':
+                    continue  # Skip positions that are already empty
+
+                # Bound: even if every untried clue could be removed, this pass can't beat the best so far
+                if current_clues - untried_clues >= prune_limit(min_clues):
+                    pruned = True
+                    break
+                untried_clues -= 1
                 
-            # Remove the clue
-            test_puzzle.change_clue(pos, '.')
+                # Remove the clue
+                current_puzzle.try_change_clue(pos, '.')
             
-            # Test if the puzzle is still solvable, and save it, if so
+                # Test if the puzzle is still solvable, and keep the removal (and the solve's stats), if so
+                if args.very_verbose:
+                    print('solving ',current_puzzle.clues_string)
+                result,stats = removal_solve(current_puzzle, {'max_tier':max_tier, 'verbose': args.verbose, 'very_verbose': args.very_verbose})
+
+                if len(result) == 81:
+                    current_puzzle.keep_change()
+                    current_clues -= 1
+                else:
+                    current_puzzle.undo_change()
+                    if variant_tracker.removal_failed(current_puzzle, pos):
+                        pruned = True
+                        break
+
+        if pruned:
             if args.very_verbose:
-                print('solving ',test_puzzle.clues_string)
-            result,stats = solve(test_puzzle, options={'max_tier':args.max_tier, 'verbose': args.verbose, 'very_verbose': args.very_verbose})
-
-            if len(result) == 81:
-                current_puzzle = test_puzzle
+                print(f"pass {pass_num+1} pruned, can't beat {min_clues} clues")
+            continue
         
         # Count remaining clues
-        remaining_clues = sum(1 for c in current_puzzle.clues_string if c != '.')
+        remaining_clues = current_clues
+        pass_results[current_puzzle.clues_string] = current_puzzle
         
-        # Keep the puzzle with the fewest clues
-        if remaining_clues < min_clues:
+        # Keep the puzzle with the fewest clues (preferring those that reached the target tier, if steering)
+        if steering and best_puzzle.annotations.get('mta', 0) < target_tier <= current_puzzle.annotations.get('mta', 0):
+            min_clues = remaining_clues
+            best_puzzle = current_puzzle.clone()
+        elif remaining_clues < min_clues and (not steering or current_puzzle.annotations.get('mta', 0) >= best_puzzle.annotations.get('mta', 0)):
             min_clues = remaining_clues
             best_puzzle = current_puzzle.clone()
             # best_puzzle.annotations = last_stats
@@ -113,8 +366,215 @@ def refine_puzzle(puzzle_rec):
 
     # print("best puzzle solution", best_puzzle.solution)
     
-    return best_puzzle, best_puzzle.annotations
+    return refinement_results(best_puzzle, pass_results)
+
+
+def construct_puzzle(puzzle_rec, max_tier=None):
+    """
+    Refine the puzzle constructively, as an alternative to refine_puzzle.  Each pass starts with 
+    an empty grid and adds clues from the fully-clued puzzle, in random order, until the solver 
+    succeeds.  The stuck solve is resumed after each added clue, rather than restarted.  A 
+    minimality sweep then removes any added clues which turned out to be unnecessary.
+
+    Returns:
+        List of refined puzzle records with minimal necessary clues (just the best one, unless --emit_all)
+    """
+    import random
+
+    if max_tier is None:
+        max_tier = args.max_tier
+    solve_options = {'max_tier':max_tier, 'verbose': args.verbose, 'very_verbose': args.very_verbose}
+    best_puzzle = puzzle_rec.clone()
+    min_clues = sum(1 for c in puzzle_rec.clues_string if c != '.')
+    pass_results = {} # distinct minimal puzzles, keyed by clues string
+
+    nbr_passes = args.max_reduction_passes if args.adaptive_passes else args.reduction_passes
+    for pass_num in range(nbr_passes):
+        if reduction_target_met(min_clues):
+            break
+
+        # Start with an empty grid
+        current_puzzle = PuzzleRecord('.' * 81, puzzle_rec.layout, puzzle_rec.puzzle_type, puzzle_rec.nom, puzzle_rec.answer_string)
+
+        # Create shuffled list of all clued positions
+        positions = [pos for pos in range(81) if puzzle_rec.clues_string[pos] != '.']
+        random.shuffle(positions)
+
+        # Add clues one by one, until the puzzle is solvable
+        added_positions = []
+        try:
+            result,stats,board = solver_module.start_resumable_solve(current_puzzle, options=solve_options)
+            for pos in positions:
+                if len(result) == 81:
+                    break
+                board.add_clue(pos % 9, pos // 9, int(puzzle_rec.clues_string[pos]))
+                added_positions.append(pos)
+                if args.very_verbose:
+                    print('resuming ',current_puzzle.clues_string)
+                result,stats = solver_module.resume(board, options=solve_options)
+        except Exception as e:
+            # the board can't be trusted after a solver error, so refine this candidate by reduction
+            print(f'Construct error: {e}, refining by reduction instead')
+            return refine_puzzle(puzzle_rec, max_tier=max_tier)
+
+        if len(result) != 81:
+            continue # not solvable at this tier, even when fully clued
+
+        # Minimality sweep - clues added early may have been made redundant by later ones
+        random.shuffle(added_positions)
+        needs_stats = True # annotations from a resumed solve include the steps taken before each resume
+        current_clues = len(added_positions)
+        untried_clues = current_clues
+        pruned = False
+        for pos in added_positions:
+            if current_clues - untried_clues >= prune_limit(min_clues):
+                pruned = True
+                break # can't beat the best so far
+            untried_clues -= 1
+            current_puzzle.try_change_clue(pos, '.')
+            if args.very_verbose:
+                print('solving ',current_puzzle.clues_string)
+            result,stats = removal_solve(current_puzzle, solve_options)
+            if len(result) == 81:
+                current_puzzle.keep_change()
+                current_clues -= 1
+                needs_stats = False
+            else:
+                current_puzzle.undo_change()
+
+        if pruned:
+            continue
+        remaining_clues = current_clues
+        if needs_stats:
+            solve(current_puzzle, options=solve_options)
+        pass_results[current_puzzle.clues_string] = current_puzzle
+
+        # Keep the puzzle with the fewest clues
+        if remaining_clues < min_clues:
+            min_clues = remaining_clues
+            best_puzzle = current_puzzle.clone()
+
+    return refinement_results(best_puzzle, pass_results)
+
+
+def refine_multi_tier(puzzle_rec):
+    """
+    Refine one candidate into a minimal puzzle for each of tiers 1 to 3.  Each tier's reduction
+    starts from the previous tier's minimal clue set, which is a superset of what the harder
+    tier needs, so most of the clue removal work is shared.  Without a pool or side output
+    to keep puzzles outside --min_tier..--max_tier, only those tiers are refined.
+
+    Returns:
+        List of (refined puzzle record, the tier it was refined with), for the distinct 
+        puzzles from all tiers
+    """
+    results = {}
+    start_puzzle = puzzle_rec
+    tiers = range(1, 4) if args.pool_dir or args.side_output else range(args.min_tier, args.max_tier+1)
+    for tier in tiers:
+        if tier == tiers[0] and args.refine_mode == 'construct':
+            tier_results = construct_puzzle(start_puzzle, max_tier=tier)
+        else:
+            tier_results = refine_puzzle(start_puzzle, max_tier=tier, target_tier=tier)
+        if args.verbose:
+            print(f"tier {tier} refinement: {[prec.annotations.get('mta') for prec in tier_results]}")
+        if not tier_results:
+            continue # nothing refined at this tier, the next one starts from the same clues
+        for refined in tier_results:
+            results.setdefault(refined.clues_string, (refined, tier))
+        start_puzzle = tier_results[0]
+    return list(results.values())
+
+def salvage_puzzle(refined, max_tier):
+    """
+    Local search for a refined puzzle with more than --max_clues clues.  Each move adds one
+    clue from the answer, then sweeps the puzzle's clues (the new one last) for any that
+    are no longer necessary.  A move is kept if it removed at least two clues, for a net
+    gain.  Stops when the puzzle is within --max_clues, or the move budget runs out.
+    max_tier should be the tier the puzzle was refined with, so it stays minimal for that tier.
+
+    Returns:
+        The salvaged puzzle record, or None
+    """
+    import random
+
+    all_clues_string = PuzzleRecord.setup_initial_clues(refined.answer_string, refined.layout)
+    if not args.allow_zeros:
+        all_clues_string = all_clues_string.replace('0', '.')
+
+    current_puzzle = refined
+    current_clues = sum(1 for c in refined.clues_string if c != '.')
+    for move in range(args.salvage_moves):
+        if current_clues <= args.max_clues:
+            break
+        add_positions = [pos for pos in range(81) if current_puzzle.clues_string[pos] == '.' and all_clues_string[pos] != '.']
+        if not add_positions:
+            break
+        add_pos = random.choice(add_positions)
+        test_puzzle = current_puzzle.clone()
+        test_puzzle.change_clue(add_pos, all_clues_string[add_pos])
+
+        sweep_positions = [pos for pos in range(81) if current_puzzle.clues_string[pos] != '.']
+        random.shuffle(sweep_positions)
+        sweep_positions.append(add_pos)
+        test_clues = current_clues + 1
+        for pos in sweep_positions:
+            test_puzzle.try_change_clue(pos, '.')
+            if args.very_verbose:
+                print('salvage solving ',test_puzzle.clues_string)
+            result,stats = removal_solve(test_puzzle, {'max_tier':max_tier, 'verbose': args.verbose, 'very_verbose': args.very_verbose})
+            if len(result) == 81:
+                test_puzzle.keep_change()
+                test_clues -= 1
+            else:
+                test_puzzle.undo_change()
+
+        if test_clues < current_clues:
+            if args.verbose:
+                print(f"salvage move {move+1}: {current_clues} -> {test_clues} clues")
+            current_puzzle = test_puzzle
+            current_clues = test_clues
 
+    return current_puzzle if current_clues <= args.max_clues else None
+
+def base_layout(layout):
+    """
+    A shallow copy of a layout with only its rows, cols and blocks (no diagonals, windows or 
+    centerdot), sharing the original's containers.  Cached on the layout, which may be shared.
+    """
+    if getattr(layout, 'base_layout', None) is None:
+        base = object.__new__(type(layout))
+        base.__dict__.update(layout.__dict__)
+        for cached in ('answer_sampler', 'container_masks', 'base_layout'):
+            base.__dict__.pop(cached, None) # built from the full set of containers
+        base.containers = layout.containers[:27]
+        layout.base_layout = base
+    return layout.base_layout
+
+def extra_containers_ignorable(refined, max_tier=None):
+    """
+    If the puzzle has any of (diagonals, windows, centerdot), check whether it can be solved without that stuff.
+    """
+    if is_variant_type(refined.puzzle_type):
+        puzzle_copy = refined.clone()
+        puzzle_copy.layout = base_layout(refined.layout)
+        result2,stats2 = solve(puzzle_copy, options={'max_tier':max_tier} if max_tier is not None else {})
+        return len(result2) == 81
+    return False
+
+def last_puzzle_number(filename):
+    """
+    The highest puzzle-N number in a puzzle file, or 0 if there's no file yet, so a file that
+    is appended to by several runs keeps its puzzle names distinct.
+    """
+    last = 0
+    if os.path.exists(filename):
+        with open(filename, 'r') as f:
+            for line in f:
+                nom = line.split('\t')[0]
+                if nom.startswith('puzzle-') and nom[7:].isdigit():
+                    last = max(last, int(nom[7:]))
+    return last
 
 def generate_puzzles(args):
     """
@@ -141,76 +601,181 @@ def generate_puzzles(args):
         args.max_tier = tier_distributions[0]
     
     tries = 0
+    side_puzzles = last_puzzle_number(args.side_output) if args.side_output else 0
+    nbr_salvaged = 0
+    pool = PuzzlePool(args.pool_dir) if args.pool_dir else None
+    predictor = DifficultyPredictor.load(args.predictor) if args.predictor else None
+    predictor_skipped = 0
+    predictor_hits = [] # predicted probabilities of refined candidates which gave an in-tier puzzle
+    predictor_misses = [] # ... and of those which didn't
+    classic_answers = ClassicAnswers() if args.uniform_answers or args.answer_index is not None else None
+    answer_stride = classic_answers.stride() if classic_answers else None
+    answer_ctr = 0
+    # batches only make sense when the layout is reused between candidates
+    batching = args.batch_size > 1 and 'jig' not in args.puzzle_type and args.answer_index is None
+    candidate_queue = []
     while len(puzzles) < n_puzzles:
 
-        if layout == None or 'jig' in args.puzzle_type:
-            # create a new layout
-            if args.verbose:
-                print(F"creating new layout")
-            # layout_module = random.choice(layout_modules)
-            layout = layout_module(9, args.puzzle_type)
-
-        puzzle_rec = PuzzleRecord.generate_candidate_puzzle(layout, args.puzzle_type, f"puzzle-{len(puzzles)+1}", allow_zeros=allow_zeros)
-        if puzzle_rec == None:
-            # likely a bad layout, try again
+        # draw from the pool before generating anything new (-ed changes the tiers as it goes)
+        pooled = pool.take(args.puzzle_type, args.allow_zeros, args.min_tier, args.max_tier, args.max_clues, args.multi_tier) if pool else None
+        if pooled is not None:
             if args.verbose:
-                print("bad layout, skipping")
-            tries += 1
-            continue
+                print(f"using pooled puzzle, tier {pooled.annotations['mta']}")
+            # minimal for the tier this run would have refined it with
+            results = [(pooled, pooled.annotations['mta'] if args.multi_tier else args.max_tier)]
+        else:
+            if layout == None or 'jig' in args.puzzle_type:
+                # create a new layout
+                if args.verbose:
+                    print(F"creating new layout")
+                # layout_module = random.choice(layout_modules)
+                witness = None
+                if layout_bank:
+                    # already checked for feasibility when the bank was built
+                    layout = layout_bank.random_layout()
+                else:
+                    layout = layout_module(9, args.puzzle_type)
+                    if 'jig' in args.puzzle_type:
+                        # check there's an answer at all, rather than finding out when the sampler gives up
+                        layout.answer_sampler = AnswerSampler(layout)
+                        witness = layout.answer_sampler.find_witness()
+                        if witness is None:
+                            if args.verbose:
+                                print("infeasible layout, skipping")
+                            layout = None
+                            tries += 1
+                            continue
+
+            if batching:
+                if not candidate_queue:
+                    answers = [classic_answers.sample() for i in range(args.batch_size)] if args.uniform_answers else None
+                    candidate_queue = PuzzleRecord.generate_candidate_puzzles(layout, args.puzzle_type, args.batch_size, allow_zeros=allow_zeros, answers=answers)
+                puzzle_rec = candidate_queue.pop(0) if candidate_queue else None
+                if puzzle_rec is not None:
+                    puzzle_rec.nom = f"puzzle-{len(puzzles)+1}"
+            else:
+                answer = None
+                if witness is not None:
+                    # the witness is a random sample, use it as the candidate's answer
+                    answer = witness
+                elif args.answer_index is not None:
+                    answer_index = (args.answer_index + answer_ctr * answer_stride) % classic_answers.total
+                    answer = classic_answers.unrank(answer_index)
+                    answer_ctr += 1
+                elif args.uniform_answers:
+                    answer = classic_answers.sample()
+                puzzle_rec = PuzzleRecord.generate_candidate_puzzle(layout, args.puzzle_type, f"puzzle-{len(puzzles)+1}", allow_zeros=allow_zeros, answer=answer)
+                if puzzle_rec is not None and args.answer_index is not None:
+                    puzzle_rec.add_annotation('answer_index', answer_index)
+            if puzzle_rec == None:
+                # likely a bad layout, try again
+                if args.verbose:
+                    print("bad layout, skipping")
+                tries += 1
+                continue
 
-        if args.draw_candidates:
-            draw_puzzle(f"drawings/candidate_{len(puzzles)+1}.png", puzzle_rec)
-        
-        if puzzle_rec is None:
-            tries += 1
-            continue
+            if args.draw_candidates:
+                draw_puzzle(f"drawings/candidate_{len(puzzles)+1}.png", puzzle_rec)
         
-        # Refine puzzle
-        refined,stats = refine_puzzle(puzzle_rec)
-
-        if args.very_verbose:
-            print(f"refined: {refined} {stats}")
-
-        if args.min_tier is not None:
-            tier_val = stats['mta'] if 'mta' in stats else 3 # stats.get('branches', 0)
-            if tier_val < args.min_tier:
-                if args.verbose:
-                    print(f"Puzzle's tier {tier_val} < {args.min_tier} ")
+            if puzzle_rec is None:
                 tries += 1
                 continue
 
-        if args.max_clues is not None:
-            if sum([1 for c in refined.clues_string if c != '.']) > args.max_clues:
+            predicted_prob = predictor.probability_in_tiers(puzzle_rec, args.min_tier, args.max_tier) if predictor else None
+            if predicted_prob is not None and predicted_prob < args.predictor_threshold:
                 if args.verbose:
-                    print(f"Puzzle has {sum([1 for c in refined.clues_string if c != '.'])} clues > {args.max_clues}")
+                    print(f"predictor skipping candidate, p(in tier)={predicted_prob:.2f}")
+                predictor_skipped += 1
                 tries += 1
                 continue
-
-        # if puzzle has any of (diagonals, windows, centerdot), insure puzzle is solveable by OR solver without that stuff
-        if 'diagonals' in args.puzzle_type or 'windows' in args.puzzle_type or 'centerdot' in args.puzzle_type:
-            puzzle_copy = refined.clone()
-            layout_copy = puzzle_copy.layout.copy()
-            layout_copy.containers = layout_copy.containers[:27] # remove diagonals, windows, centerdot
-            puzzle_copy.layout = layout_copy
-            result2,stats2 = solve(puzzle_copy)
-            if len(result2) == 81:
+        
+            # Refine puzzle
+            if args.multi_tier:
+                results = refine_multi_tier(puzzle_rec)
+            elif args.refine_mode == 'construct':
+                results = [(refined, args.max_tier) for refined in construct_puzzle(puzzle_rec)]
+            else:
+                results = [(refined, args.max_tier) for refined in refine_puzzle(puzzle_rec)]
+
+        candidate_in_tier = False
+        for refined, refined_tier in results:
+            stats = refined.annotations
+            if args.very_verbose:
+                print(f"refined: {refined} {stats}")
+
+            if args.max_clues is not None:
+                if sum([1 for c in refined.clues_string if c != '.']) > args.max_clues:
+                    if args.verbose:
+                        print(f"Puzzle has {sum([1 for c in refined.clues_string if c != '.'])} clues > {args.max_clues}")
+                    salvaged = salvage_puzzle(refined, refined_tier) if args.salvage_moves else None
+                    if salvaged is None:
+                        continue
+                    nbr_salvaged += 1
+                    refined = salvaged
+                    stats = refined.annotations
+
+            in_tier = True
+            if args.min_tier is not None:
+                tier_val = stats['mta'] if 'mta' in stats else 3 # stats.get('branches', 0)
+                if tier_val < args.min_tier:
+                    if args.verbose:
+                        print(f"Puzzle's tier {tier_val} < {args.min_tier} ")
+                    in_tier = False
+                elif 'mta' in stats and tier_val > args.max_tier: # only possible with --multi_tier
+                    if args.verbose:
+                        print(f"Puzzle's tier {tier_val} > {args.max_tier} ")
+                    in_tier = False
+                if not in_tier and not args.side_output and not pool:
+                    continue
+
+            # checked with every rule tier, so pooled puzzles have already passed it
+            if refined is not pooled and extra_containers_ignorable(refined):
                 if args.verbose:
                     print(f"Puzzle extra containers can be ignored, skipping")
-                tries += 1
+                continue
+            candidate_in_tier = candidate_in_tier or in_tier
+
+            if not in_tier or len(puzzles) >= n_puzzles:
+                # valid, but not what we're looking for right now
+                if pool:
+                    pool.add(refined, pool_options(args.allow_zeros, refined_tier))
+                if args.side_output:
+                    side_puzzles += 1
+                    side_puzzle = refined.clone()
+                    side_puzzle.nom = f"puzzle-{side_puzzles}"
+                    with open(args.side_output, 'a') as f:
+                        f.write(str(side_puzzle)+"\n")
                 continue
 
-        if not args.output_file: # output puzzle as generated
-            print(str(refined))
-        
-        puzzles.append((refined, refined.solution, stats))
+            refined.nom = f"puzzle-{len(puzzles)+1}"
+            if not args.output_file: # output puzzle as generated
+                print(str(refined))
+            
+            puzzles.append((refined, refined.solution, stats))
+            if args.even_distribute:
+                dist_ctr += 1
+                dist_ctr %= len(tier_distributions)
+                args.min_tier = tier_distributions[dist_ctr]
+                args.max_tier = tier_distributions[dist_ctr]
+        if pooled is None and predicted_prob is not None:
+            (predictor_hits if candidate_in_tier else predictor_misses).append(predicted_prob)
         tries += 1
-        if args.even_distribute:
-            dist_ctr += 1
-            dist_ctr %= len(tier_distributions)
-            args.min_tier = tier_distributions[dist_ctr]
-            args.max_tier = tier_distributions[dist_ctr]
 
+    if pool:
+        if args.verbose:
+            print(f"Pool: drew {pool.nbr_taken} puzzles, added {pool.nbr_added}")
+    if args.prefilter:
+        print(f"# Prefilter: skipped {prefilter_stats['saved']} of {prefilter_stats['checks']} removal solves as ambiguous")
+    if predictor:
+        # how well the predictor separates the candidates which were worth refining from those which weren't
+        print(f"# Predictor: skipped {predictor_skipped} candidates, {len(predictor_hits)} refined candidates in tier, {len(predictor_misses)} out of tier")
+        if predictor_hits:
+            print(f"# Predictor: in tier avg p={sum(predictor_hits)/len(predictor_hits):.3f}")
+        if predictor_misses:
+            print(f"# Predictor: out of tier avg p={sum(predictor_misses)/len(predictor_misses):.3f}")
     if args.verbose:
+        if args.salvage_moves:
+            print("Salvaged", nbr_salvaged)
         print("Tries", tries)
     return puzzles
 
@@ -0,0 +1,115 @@
+# layout_bank.py
+#
+# A bank of pre-generated jigsaw layouts, each already checked to have at least one answer, so
+# the generator can pick a layout at random instead of growing and checking a new one per candidate.
+#
+# File format: a 64 byte header (magic, version, count, puzzle type), then fixed size records of
+# 81 bytes of block letters (the layout string) followed by 81 bytes of cell addresses, listed
+# block by block (A's 9 cells, then B's...), so a record's containers can be built without a scan.
+# The file is memory mapped, so opening a large bank is cheap and records are only read when used.
+#
+# python layout_bank.py build -pt lime-jigsaw-windows -n 10000 -o layouts/lime-jigsaw-windows.bank
+# python layout_bank.py info layouts/lime-jigsaw-windows.bank
+
+import mmap
+import random
+import struct
+from layout_jiggy9 import Layout as JiggyLayout
+
+MAGIC = b'LIMEBANK'
+VERSION = 1
+HEADER_FORMAT = '<8sII44s'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+NUM_SYMBOLS = 9
+AREA = NUM_SYMBOLS * NUM_SYMBOLS
+RECORD_SIZE = AREA * 2
+
+def encode_layout(layout_string):
+    block_cells = []
+    for letter in "ABCDEFGHI":
+        block_cells.extend(addr for addr,ch in enumerate(layout_string) if ch == letter)
+    return layout_string.encode('ascii') + bytes(block_cells)
+
+class LayoutBank():
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, ptype = struct.unpack_from(HEADER_FORMAT, self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a layout bank")
+        self.puzzle_type = ptype.rstrip(b'\0').decode('ascii')
+
+    def __len__(self):
+        return self.count
+
+    def record(self, idx):
+        offset = HEADER_SIZE + idx * RECORD_SIZE
+        return self.mm[offset:offset+RECORD_SIZE]
+
+    def layout_string(self, idx):
+        return self.record(idx)[:AREA].decode('ascii')
+
+    def block_containers(self, idx):
+        """The 9 block containers of a layout, as tuples of (x,y)."""
+        cells = self.record(idx)[AREA:]
+        return [tuple((addr % NUM_SYMBOLS, addr // NUM_SYMBOLS) for addr in cells[b*NUM_SYMBOLS:(b+1)*NUM_SYMBOLS])
+                for b in range(NUM_SYMBOLS)]
+
+    def layout(self, idx):
+        return JiggyLayout(NUM_SYMBOLS, self.puzzle_type, layoutInit=self.layout_string(idx), blocksInit=self.block_containers(idx))
+
+    def random_layout(self, rng=random):
+        return self.layout(rng.randrange(self.count))
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+def build_bank(filename, puzzle_type, count, verbose=False):
+    """Generate count distinct feasible layouts of puzzle_type and write them to filename."""
+    from answer_sampler import AnswerSampler
+
+    seen = set()
+    nbr_infeasible = 0
+    with open(filename, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, count, puzzle_type.encode('ascii')))
+        while len(seen) < count:
+            layout = JiggyLayout(NUM_SYMBOLS, puzzle_type)
+            if layout.layout in seen:
+                continue
+            if AnswerSampler(layout).find_witness() is None:
+                nbr_infeasible += 1
+                continue
+            seen.add(layout.layout)
+            f.write(encode_layout(layout.layout))
+            if verbose and len(seen) % 1000 == 0:
+                print(f"{len(seen)} layouts")
+    return nbr_infeasible
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build or show a bank of jigsaw layouts')
+    parser.add_argument('command', choices=['build', 'info'], help='build a bank, or show one')
+    parser.add_argument('bank_file', nargs='?', help='Bank file to show')
+    parser.add_argument('-pt', '--puzzle_type', type=str, default='lime-jigsaw', help='Jigsaw puzzle type (default: %(default)s)')
+    parser.add_argument('-n', '--number', type=int, default=10000, help='Number of layouts (default: %(default)s)')
+    parser.add_argument('-o', '--output_file', type=str, help='Bank file to build (default: <puzzle_type>.bank)')
+    parser.add_argument('-r', '--random_seed', type=int, default=0, help='Random seed (default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show progress')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if 'jig' not in args.puzzle_type:
+            parser.error("layout banks are only for jigsaw puzzle types")
+        random.seed(args.random_seed)
+        output_file = args.output_file or f"{args.puzzle_type}.bank"
+        nbr_infeasible = build_bank(output_file, args.puzzle_type, args.number, verbose=args.verbose)
+        print(f"Wrote {args.number} {args.puzzle_type} layouts to {output_file} ({nbr_infeasible} infeasible layouts skipped)")
+    else:
+        if not args.bank_file:
+            parser.error("info needs a bank file")
+        bank = LayoutBank(args.bank_file)
+        print(f"{args.bank_file}: {len(bank)} {bank.puzzle_type} layouts")
+        for idx in range(min(len(bank), 5)):
+            print(bank.layout_string(idx))
@@ -1,12 +1,70 @@
 # jigsaw_maker
 import random, sys, logging
 
-# hastily ported from my C code - not very python-idiomatic yet
+# originally ported from my C code.  Cells are region numbers (EMPTY for unassigned), and the
+# per-cell neighbour and mirror addresses are computed once per maker, so the growth passes
+# and legality checks don't recompute coordinates.  Each region's cells are kept as a set as
+# they're assigned, so docking only looks around the region rather than scanning the grid.
+# The random calls are made in the same order as the original port, so a given seed still
+# gives the same layouts.
+
+EMPTY = -1
+
+def make_bridge_table():
+    # for each mask of same-region neighbours (bit 0 = up-left, then clockwise), whether
+    # removing the centre cell could split the region
+    table = [False] * 256
+    for nMask in range(256):
+        res = nMask & 0xaa
+        if res == 0x88 or res == 22:
+            table[nMask] = True
+        elif res == 0x0A:
+            table[nMask] = (nMask & 0x04) == 0
+        elif res == 0x28:
+            table[nMask] = (nMask & 0x10) == 0
+        elif res == 0xa0:
+            table[nMask] = (nMask & 0x40) == 0
+        elif res == 0x82:
+            table[nMask] = (nMask & 0x01) == 0
+        elif res == 0x8a:
+            table[nMask] = (nMask & 0x05) != 0x05
+        elif res == 0x2a:
+            table[nMask] = (nMask & 0x14) != 0x14
+        elif res == 0xa8:
+            table[nMask] = (nMask & 0x50) != 0x50
+        elif res == 0xa2:
+            table[nMask] = (nMask & 0x41) != 0x41
+    return table
+
+BRIDGE_TABLE = make_bridge_table()
 
 class JigsawMaker():
     def __init__(self, num_symbols):
         self.num_symbols = num_symbols
         self.num_squares = num_symbols * num_symbols # assumes square grid - may need to fix for samurai...
+        n = num_symbols
+        # orthogonal neighbours, in the order left, up, right, down
+        self.ortho_neighbors = []
+        # the 8 surrounding cells (or None off the grid), in isBridge's bit order
+        self.ring_neighbors = []
+        for idx in range(self.num_squares):
+            (x,y) = (idx % n, idx // n)
+            self.ortho_neighbors.append([y*n+x+dx if dy == 0 else (y+dy)*n+x for dx,dy in ((-1,0),(0,-1),(1,0),(0,1))
+                                         if 0 <= x+dx < n and 0 <= y+dy < n])
+            ring = []
+            for dx,dy in ((-1,-1),(0,-1),(1,-1),(1,0),(1,1),(0,1),(-1,1),(-1,0)):
+                ring.append((y+dy)*n+x+dx if 0 <= x+dx < n and 0 <= y+dy < n else None)
+            self.ring_neighbors.append(ring)
+
+    def set_mirrors(self):
+        # mirror address of each cell for the current symmetry
+        n = self.num_symbols
+        self.mirrors = []
+        for idx in range(self.num_squares):
+            (x,y) = (idx % n, idx // n)
+            x2 = (n-1)-x if (self.symFlags & 0x05) != 0 else x
+            y2 = (n-1)-y if (self.symFlags & 0x06) != 0 else y
+            self.mirrors.append(y2*n + x2)
 
     def init_growth_fill(self):
         # should return cells
@@ -21,7 +79,9 @@ class JigsawMaker():
             self.symFlags = 2  # Y
         # self.symFlags = 0
         # print("SYMMETRY",self.symFlags)
-        self.cells = ['.'] * self.num_squares
+        self.set_mirrors()
+        self.cells = [EMPTY] * self.num_squares
+        self.region_cells = [set() for n in range(self.num_symbols)]
         self.pairedColors = [-1] * self.num_symbols
         self.nbrUsed = [0] * self.num_symbols
         self.totUsed = 0
@@ -31,177 +91,99 @@ class JigsawMaker():
             n = 0
             self.pairedColors[n] = n
             idx = 4*self.num_symbols + 4
-            self.cells[idx] = chr(ord('A')+n)
+            self.set_cell(idx, n)
             self.popJQueue(n)
         elif self.symFlags == 1 or self.symFlags == 2:
             for n in range(3):
                 self.pairedColors[n] = n
                 for i in range(3):
                     idx = (3*n+i)*self.num_symbols+4 if self.symFlags == 1 else 4*self.num_symbols+(3*n+i)
-                    self.cells[idx] = chr(ord('A')+n)
+                    self.set_cell(idx, n)
                     self.popJQueue(n)
 
+    def set_cell(self, idx, r):
+        # assign a cell to region r (or EMPTY), keeping the regions' cell sets up to date
+        old = self.cells[idx]
+        if old != EMPTY:
+            self.region_cells[old].discard(idx)
+        self.cells[idx] = r
+        if r != EMPTY:
+            self.region_cells[r].add(idx)
+
     def is_too_perfect_jigsaw_grid(self, cells):
+        # more than one plain 3x3 block, full column or full row
+        n = self.num_symbols
         numBlocks = 0
-        numRows = 0
-        numCols = 0
-        for y in range(0,self.num_symbols,3):
-            for x in range(0,self.num_symbols,3):
-                n = y*self.num_symbols + x
-                if  cells[n] == cells[n+1] \
-                and cells[n] == cells[n+2] \
-                and cells[n] == cells[n+self.num_symbols] \
-                and cells[n] == cells[n+self.num_symbols+1] \
-                and cells[n] == cells[n+self.num_symbols+2] \
-                and cells[n] == cells[n+self.num_symbols*2] \
-                and cells[n] == cells[n+self.num_symbols*2+1] \
-                and cells[n] == cells[n+self.num_symbols*2+2]:
+        for y in range(0,n,3):
+            for x in range(0,n,3):
+                i = y*n + x
+                r = cells[i]
+                if all(cells[i + dy*n + dx] == r for dy in range(3) for dx in range(3)):
                     numBlocks += 1
         if numBlocks > 1:
             return True
 
-        for x in range(self.num_symbols):
-            n = x
-            if cells[n] == cells[n+self.num_symbols*1] \
-            and cells[n] == cells[n+self.num_symbols*2] \
-            and cells[n] == cells[n+self.num_symbols*3] \
-            and cells[n] == cells[n+self.num_symbols*4] \
-            and cells[n] == cells[n+self.num_symbols*5] \
-            and cells[n] == cells[n+self.num_symbols*6] \
-            and cells[n] == cells[n+self.num_symbols*7] \
-            and cells[n] == cells[n+self.num_symbols*8]:
-                numCols += 1
+        numCols = sum(1 for x in range(n) if all(cells[x + y*n] == cells[x] for y in range(1,n)))
         if numCols > 1:
             return True
 
-        for y in range(self.num_symbols):
-            n = y*self.num_symbols
-            if cells[n] == cells[n+1] \
-            and cells[n] == cells[n+2] \
-            and cells[n] == cells[n+3] \
-            and cells[n] == cells[n+4] \
-            and cells[n] == cells[n+5] \
-            and cells[n] == cells[n+6] \
-            and cells[n] == cells[n+7] \
-            and cells[n] == cells[n+8]:
-                numRows += 1
+        numRows = sum(1 for y in range(n) if all(cells[y*n + x] == cells[y*n] for x in range(1,n)))
         if numRows > 1:
             return True
 
         return False
 
-    def getCell(self, x,y):
-        return self.cells[y * self.num_symbols + x]
-
     def isBridge(self, cells, idx):
-        nMask = 0
-        (cx,cy) = (idx % self.num_symbols, idx // self.num_symbols)
         cr = cells[idx]
-
-        # make bitmask for neighboring connections
-        if cx > 0 and cy > 0 and self.getCell(cx-1,cy-1) == cr:
-            nMask |= 0x01
-        if cy > 0 and self.getCell(cx,cy-1) == cr:
-            nMask |= 0x02
-        if cx < self.num_symbols-1 and cy > 0 and self.getCell(cx+1,cy-1) == cr:
-            nMask |= 0x04
-        if cx < self.num_symbols-1 and self.getCell(cx+1,cy) == cr:
-            nMask |= 0x08
-        if cx < self.num_symbols-1 and cy < self.num_symbols-1 and self.getCell(cx+1,cy+1) == cr:
-            nMask |= 0x10
-        if cy < self.num_symbols-1 and self.getCell(cx,cy+1) == cr:
-            nMask |= 0x20
-        if cx > 0 and cy < self.num_symbols-1 and self.getCell(cx-1,cy+1) == cr:
-            nMask |= 0x40
-        if cx > 0 and self.getCell(cx-1,cy) == cr:
-            nMask |= 0x80
-
-        res = nMask & 0xaa
-        if res == 0x88 or res == 22:
-            return True
-        elif res == 0x0A:
-            if ((nMask & 0x04) == 0):
-                return True
-        elif res == 0x28:
-            if ((nMask & 0x10) == 0):
-                return True
-        elif res == 0xa0:
-            if ((nMask & 0x40) == 0):
-                return True
-        elif res == 0x82:
-            if ((nMask & 0x01) == 0):
-                return True
-        elif res == 0x8a:
-            if ((nMask & 0x05) != 0x05):
-                return True
-        elif res == 0x2a:
-            if ((nMask & 0x14) != 0x14):
-                return True
-        elif res == 0xa8:
-            if ((nMask & 0x50) != 0x50):
-                return True
-        elif res == 0xa2:
-            if ((nMask & 0x41) != 0x41):
-                return True
-        return False
-
-    def isSelfReflexive(self, x, y):
+        nMask = 0
+        bit = 1
+        for ni in self.ring_neighbors[idx]:
+            if ni is not None and cells[ni] == cr:
+                nMask |= bit
+            bit <<= 1
+        return BRIDGE_TABLE[nMask]
+
+    def isSelfReflexive(self, idx):
         if self.symFlags == 0:
             return False
-        x2 = (self.num_symbols-1)-x if (self.symFlags & 0x05) != 0 else x
-        y2 = (self.num_symbols-1)-y if (self.symFlags & 0x06) != 0 else y
-        return x2 == x and y2 == y
-
-    def floodFill(self, cells, n):
-        (x,y) = (n % self.num_symbols, n // self.num_symbols)
-        r = cells[n]
-        self.fills[n] = cells[n]
-        self.fillSum += 1
-        if x > 0 and self.fills[n-1] == 0 and cells[n-1] == r:
-            self.floodFill(cells,n-1)
-        if y > 0 and self.fills[n-self.num_symbols] == 0 and cells[n-self.num_symbols] == r:
-            self.floodFill(cells,n-self.num_symbols)
-        if x < self.num_symbols-1 and self.fills[n+1] == 0 and cells[n+1] == r:
-            self.floodFill(cells,n+1)
-        if y < self.num_symbols-1 and self.fills[n+self.num_symbols] == 0 and cells[n+self.num_symbols] == r:
-            self.floodFill(cells,n+self.num_symbols)
-
-    def floodFillCount(self, cells, n):
-        self.fillSum = 0
-        self.floodFill(cells, n)
-        return self.fillSum
+        return self.mirrors[idx] == idx
+
+    def find(self, parents, i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
 
     def is_grid_legal(self, cells):
-        # print("islegal",''.join(cells))
         rsums = [0] * self.num_symbols
-        for n in range(self.num_squares):
-            if cells[n] == 0 or ord(cells[n]) < ord('A') or ord(cells[n]) > ord('A')+self.num_symbols:
+        for r in cells:
+            if r < 0 or r >= self.num_symbols:
                 return False
-            rsums[ord(cells[n]) - ord('A')] += 1
+            rsums[r] += 1
         for i in range(self.num_symbols):
             if rsums[i] != self.num_symbols:
                 return False
         # simple orphan check
-        for n in range(self.num_squares):
-            (x,y) = (n % self.num_symbols, n // self.num_symbols)
-            r = cells[n]
-            if x > 0 and ord(self.getCell(x-1,y)) == ord(r):
-                continue
-            if x < self.num_symbols-1 and ord(self.getCell(x+1,y)) == ord(r):
-                continue
-            if y > 0 and ord(self.getCell(x,y-1)) == ord(r):
-                continue
-            if y < self.num_symbols-1 and ord(self.getCell(x,y+1)) == ord(r):
-                continue
-            return False
-        # check for islands using flood fill
-        self.fills = [0] * self.num_squares
-        for n in range(self.num_squares):
-            if self.fills[n] == 0:
-                if self.floodFillCount(cells,n) != self.num_symbols:
-                    return False
-        if self.is_too_perfect_jigsaw_grid(cells):
-            return False
+        for idx in range(self.num_squares):
+            r = cells[idx]
+            if not any(cells[ni] == r for ni in self.ortho_neighbors[idx]):
+                return False
+        # check for islands: union-find over same-region neighbours, each region must be one set
+        parents = list(range(self.num_squares))
+        for idx in range(self.num_squares):
+            for ni in self.ortho_neighbors[idx]:
+                if ni > idx and cells[ni] == cells[idx]:
+                    ra = self.find(parents, idx)
+                    rb = self.find(parents, ni)
+                    if ra != rb:
+                        parents[rb] = ra
+        roots = [-1] * self.num_symbols
+        for idx in range(self.num_squares):
+            root = self.find(parents, idx)
+            if roots[cells[idx]] == -1:
+                roots[cells[idx]] = root
+            elif roots[cells[idx]] != root:
+                return False
         return True
 
     def pushJQueue(self, n):
@@ -229,87 +211,59 @@ class JigsawMaker():
         return -1
 
     def growth_fill_pass(self):
-        # print("gfp",''.join(self.cells),self.totUsed)
+        cells = self.cells
         if self.totUsed < self.num_squares:
             n = self.getUnplacedRegion()
             if n == -1:
                 logging.info("Failed to get unplaced region")
-            # print("  ",n)
             if self.nbrUsed[n] == 1: # ? unused
                 idx = 0
                 while True:
                     idx = random.randrange(self.num_squares)
-                    if self.cells[idx] == '.':
+                    if cells[idx] == EMPTY:
                         break
-                (cx,cy) = (idx % self.num_symbols, idx // self.num_symbols)
-                self.cells[idx] = chr(ord('A')+n)
-                if self.cells[idx] == '@':
-                    logging.info("@A!!")
-                # print("  added",idx)
+                self.set_cell(idx, n)
                 if self.symFlags != 0:
                     for i in range(self.num_symbols):
                         if i != n and self.pairedColors[i] == -1:
                             self.pairedColors[n] = i
                             self.pairedColors[i] = n
                             break
-                    x2 = (self.num_symbols-1)-cx if (self.symFlags & 0x05) != 0 else cx
-                    y2 = (self.num_symbols-1)-cy if (self.symFlags & 0x06) != 0 else cy
-                    if x2 != cx or y2 != cy:
-                        idx2 = y2*self.num_symbols + x2
-                        self.cells[idx2] = chr(ord('A')+self.pairedColors[n])
-                        if self.cells[idx2] == '@':
-                            logging.info("@B!!")
-                        # print("    addeds",idx2)
+                    idx2 = self.mirrors[idx]
+                    if idx2 != idx:
+                        self.set_cell(idx2, self.pairedColors[n])
                         self.popJQueue(self.pairedColors[n])
             else:
-                # print("docking")
-                docks = []
-                neighbors = []
-                for i in range(self.num_squares):
-                    (x,y) = (i % self.num_symbols, i // self.num_symbols)
-                    if (x > 0 and self.getCell(x-1,y) == chr(ord('A')+n)) \
-                    or (y > 0 and self.getCell(x,y-1) == chr(ord('A')+n)) \
-                    or (x < self.num_symbols-1 and self.getCell(x+1,y) == chr(ord('A')+n)) \
-                    or (y < self.num_symbols-1 and self.getCell(x,y+1) == chr(ord('A')+n)):
-                        if self.cells[i] == '.':
-                            docks.append(i)
-                        elif not self.isBridge(self.cells, i) and not self.isSelfReflexive(x,y) \
-                        and self.nbrUsed[ord(self.cells[i]) - ord("A")] != 1:
-                            neighbors.append(i)
+                # docking
+                # cells next to region n, in address order
+                touching = set()
+                for idx in self.region_cells[n]:
+                    touching.update(self.ortho_neighbors[idx])
+                touching = sorted(touching)
+                docks = [i for i in touching if cells[i] == EMPTY]
                 if len(docks) == 0:
+                    # cells which could be taken from other regions, only needed without a dock
+                    neighbors = [i for i in touching if self.nbrUsed[cells[i]] != 1
+                                 and not self.isSelfReflexive(i) and not self.isBridge(cells, i)]
                     if len(neighbors) == 0:
                         self.pushJQueue(n)
                         logging.info("no neighbors nor docks for region" + chr(ord('A')+n) + " " + str(docks)+ " " + str(neighbors))
                         return
                     nidx = random.choice(neighbors)
-                    (ncx,ncy) = (nidx % self.num_symbols, nidx // self.num_symbols)
                     docks.append(nidx)
-                    self.pushJQueue(ord(self.cells[nidx]) - ord("A"))
-                    self.cells[nidx] = '.'
-                    # print("  blanked",nidx)
+                    self.pushJQueue(cells[nidx])
+                    self.set_cell(nidx, EMPTY)
                     if self.symFlags != 0:
-                        x2 = (self.num_symbols-1)-ncx if (self.symFlags & 0x05) != 0 else ncx
-                        y2 = (self.num_symbols-1)-ncy if (self.symFlags & 0x06) != 0 else ncy
-                        if x2 != ncx or y2 != ncy:
-                            nidx2 = y2 * self.num_symbols + x2
-                            self.pushJQueue(ord(self.cells[nidx2]) - ord('A'))
-                            self.cells[nidx2] = '.'
-                            # print("    blankeds",nidx)
+                        nidx2 = self.mirrors[nidx]
+                        if nidx2 != nidx:
+                            self.pushJQueue(cells[nidx2])
+                            self.set_cell(nidx2, EMPTY)
                 didx = random.choice(docks)
-                (dcx,dcy) = (didx % self.num_symbols, didx // self.num_symbols)
-                self.cells[didx] = chr(ord('A') + n)
-                if self.cells[didx] == '@':
-                    logging.info("@D!!")
-                # print("  2added",didx)
+                self.set_cell(didx, n)
                 if self.symFlags != 0:
-                    x2 = (self.num_symbols-1)-dcx if (self.symFlags & 0x05) != 0 else dcx
-                    y2 = (self.num_symbols-1)-dcy if (self.symFlags & 0x06) != 0 else dcy
-                    if x2 != dcx or y2 != dcy:
-                        didx2 = y2 * self.num_symbols + x2
-                        self.cells[didx2] = chr(ord('A') + self.pairedColors[n])
-                        if self.cells[didx2] == '@':
-                            logging.info("@C!!")
-                        # print("  2addeds",didx2)
+                    didx2 = self.mirrors[didx]
+                    if didx2 != didx:
+                        self.set_cell(didx2, self.pairedColors[n])
                         self.popJQueue(self.pairedColors[n])
 
     def growth_fill(self):
@@ -322,7 +276,7 @@ class JigsawMaker():
                 self.growth_fill_pass()
                 passes += 1
             if self.totUsed == self.num_squares:
-                # print("tot_used",self.totUsed)
+                # cheapest checks first
                 if self.is_too_perfect_jigsaw_grid(self.cells):
                     continue
                 if not self.is_grid_legal(self.cells):
@@ -339,12 +293,12 @@ class JigsawMaker():
         outs = ""
         for n in range(self.num_squares):
             r = self.cells[n]
-            if r == '.':
+            if r == EMPTY:
                 continue
-            if mapping[ord(r)-ord("A")] == 0:
-                mapping[ord(r)-ord("A")] = cr
+            if mapping[r] == 0:
+                mapping[r] = cr
                 cr = chr(ord(cr)+1)
-            outs += mapping[ord(r)-ord("A")]
+            outs += mapping[r]
         return outs
 
 # it seems likely these grids won't necessarily make a valid puzzle - need to skip bad ones
@@ -359,15 +313,19 @@ from layout_classic import Layout as ClassicLayout
 import sys
 
 class Layout(ClassicLayout):
-    def __init__(self, num_symbols, ptype, layoutInit = None):
+    def __init__(self, num_symbols, ptype, layoutInit = None, blocksInit = None):
         self.layout = layoutInit
+        self.blocksInit = blocksInit # precomputed block containers for layoutInit (e.g. from a layout bank)
         super().__init__(num_symbols, ptype)
 
     def setup_blocks(self):
         # jigsaws
         if self.layout is None:
             self.layout = jigsaw_maker(self.num_symbols)
-        self.setup_blocks_by_layout(self.layout)
+        if self.blocksInit is not None:
+            self.containers.extend(self.blocksInit)
+        else:
+            self.setup_blocks_by_layout(self.layout)
         # for letter in "ABCDEFGHIJKLMNOP"[:self.num_symbols]:
         #     cont = [addr for addr,ch in enumerate(self.layout) if ch == letter]
         #     self.containers.append(tuple(cont))
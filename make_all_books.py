@@ -18,9 +18,9 @@ copyright_years = {1:2025, 2:2025}
 
 # current estimated time for 1 volume: 3 hours, 50 minutes (3.84 hours)
 puzz_types = [
-    {'nom': 'lime-easy', 'opts':'-mint 1 -maxt 1', 'n':puzzles_per_book*books_per_volume, 'ptype': 'lime'}, # 244 (seconds)
-    {'nom': 'lime-med',  'opts':'-mint 2 -maxt 2', 'n':puzzles_per_book*books_per_volume, 'ptype': 'lime'}, # 858
-    {'nom': 'lime-hard', 'opts':'-mint 3 -maxt 3', 'n':puzzles_per_book*books_per_volume, 'ptype': 'lime'}, # 5192
+    {'nom': 'lime-easy', 'opts':'-mint 1 -maxt 1 -mt', 'n':puzzles_per_book*books_per_volume, 'ptype': 'lime'}, # 244 (seconds)
+    {'nom': 'lime-med',  'opts':'-mint 2 -maxt 2 -mt', 'n':puzzles_per_book*books_per_volume, 'ptype': 'lime'}, # 858
+    {'nom': 'lime-hard', 'opts':'-mint 3 -maxt 3 -mt', 'n':puzzles_per_book*books_per_volume, 'ptype': 'lime'}, # 5192
     {'nom': 'lime-jigsaw', 'opts':'-mint 1 -maxt 3 -ed', 'n':puzzles_per_book*books_per_volume, 'ptype': 'lime-jigsaw'}, # 4163
 
     # variety books constucted by interleaving these six intermediate files
@@ -44,6 +44,9 @@ print_types = [
 
 fname_template = "./puzzledata/<NOM>-V<VOL>.tsv"
 
+# valid puzzles in the wrong tier are kept here, by type and tier, and drawn on by later runs
+pool_dir = "./puzzlepool"
+
 reformat_script_path = '../utils/sidebyside.py'
 
 reformat_args = (["-s a4 -o sheets", "_a4_sheets"], 
@@ -61,7 +64,7 @@ for v in range(1,nbr_volumes + 1):
             continue
         type_opts = ptype['opts']
         num_puzzles = ptype['n']
-        cmd = F'pypy3 gen_puzzles.py -pt {ptype["ptype"]} -r {rseed} -n {num_puzzles} {type_opts} -o {ofname}'
+        cmd = F'pypy3 gen_puzzles.py -pt {ptype["ptype"]} -r {rseed} -n {num_puzzles} {type_opts} -pool {pool_dir} -pf -o {ofname}'
         print(cmd)
         # call command
         subprocess.check_call(cmd, shell=True)
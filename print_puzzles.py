@@ -9,6 +9,7 @@ import print_config as cfg
 import random
 from print_logo import print_logo
 from puzzle_record import PuzzleRecord
+from puzzle_store import is_puzzle_store, read_puzzles
 import datetime
 
 parser = argparse.ArgumentParser()
@@ -37,20 +38,24 @@ page_title = page_title.replace("<VOL>", str(args.vol)).replace("<BOOK>", str(ar
 page_subtitle = (args.subtitle_override if args.subtitle_override else cfg.page_subtitle)
 page_subtitle = page_subtitle.replace("<VOL>", str(args.vol)).replace("<BOOK>", str(args.book))
 
-with open(args.ifilename) as f:
-    pctr = 0
-    for line in f:
-        if line[0] == '#' or not line.strip():
-            continue
-        pctr += 1
-        if pctr < line_offset:
-           continue
-        if args.verbose:
-            print("parsing puzzle", line)
-        puzrec = PuzzleRecord.parse_puzzle(line)
-        puzzles.append(puzrec)
-        if args.nbr_puzzles and len(puzzles) == args.nbr_puzzles:
-            break
+if is_puzzle_store(args.ifilename):
+    # jump straight to the book's puzzles
+    puzzles = read_puzzles(args.ifilename, line_offset-1, args.nbr_puzzles)
+else:
+    with open(args.ifilename) as f:
+        pctr = 0
+        for line in f:
+            if line[0] == '#' or not line.strip():
+                continue
+            pctr += 1
+            if pctr < line_offset:
+               continue
+            if args.verbose:
+                print("parsing puzzle", line)
+            puzrec = PuzzleRecord.parse_puzzle(line)
+            puzzles.append(puzrec)
+            if args.nbr_puzzles and len(puzzles) == args.nbr_puzzles:
+                break
 
 if len(puzzles) == 0:
     print("No puzzles found in %s" % args.ifilename)
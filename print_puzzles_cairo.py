@@ -10,6 +10,7 @@ from lxml import etree as ET
 import re
 import os
 from puzzle_record import PuzzleRecord
+from puzzle_store import is_puzzle_store, read_puzzles as read_store_puzzles
 import print_config as cfg
 import datetime
 
@@ -40,21 +41,25 @@ def read_puzzles(args):
     page_subtitle = (args.subtitle_override if args.subtitle_override else cfg.page_subtitle)
     page_subtitle = page_subtitle.replace("<VOL>", str(args.vol)).replace("<BOOK>", str(args.book))
 
-    with open(args.ifilename) as f:
-        pctr = 0
-        for line in f:
-            if not line:
-                continue
-            if line[0] == '#':
-                continue
-            pctr += 1
-            if pctr < line_offset:
-                continue
-            # !! REWRITE USING puzzle_class
-            puzrec = PuzzleRecord.parse_puzzle(line)
-            puzzles.append(puzrec)
-            if args.nbr_puzzles and len(puzzles) == args.nbr_puzzles:
-                break
+    if is_puzzle_store(args.ifilename):
+        # jump straight to the book's puzzles
+        puzzles = read_store_puzzles(args.ifilename, line_offset - 1, args.nbr_puzzles)
+    else:
+        with open(args.ifilename) as f:
+            pctr = 0
+            for line in f:
+                if not line:
+                    continue
+                if line[0] == '#':
+                    continue
+                pctr += 1
+                if pctr < line_offset:
+                    continue
+                # !! REWRITE USING puzzle_class
+                puzrec = PuzzleRecord.parse_puzzle(line)
+                puzzles.append(puzrec)
+                if args.nbr_puzzles and len(puzzles) == args.nbr_puzzles:
+                    break
 
     if len(puzzles) == 0:
         print(f"No puzzles found in {args.ifilename}")
@@ -0,0 +1,108 @@
+# puzzle_pool.py
+#
+# A persistent pool of refined puzzles, with one bucket (file) per (puzzle_type, mta, options),
+# where the options are the generator settings that shape a refined puzzle (allow zeros, and the
+# max tier it was refined with).  The generator adds valid puzzles which don't match the tier
+# it is currently looking for, and later runs draw from the matching buckets before generating
+# anything new.  Production rules are ordered by tier, so a puzzle refined with max tier T and
+# with mta m is solvable and minimal for any max tier from m to T, and runs with a lower max tier
+# draw from the higher buckets too: the easy and medium by-products of hard runs get used.
+# Taking a puzzle rewrites its bucket straight away, so an interrupted run can't hand the same
+# puzzle out twice.
+
+import os
+from puzzle_record import PuzzleRecord
+
+MAX_TIER = 3 # the hardest production rule tier
+
+def pool_options(allow_zeros, max_tier):
+    """
+    The bucket name suffix for the settings a puzzle was refined with, e.g. 'nz-maxt3'.
+    (Multi-tier runs refine each tier with that tier as the max, so they pass that tier.)
+    """
+    return f"{'z' if allow_zeros else 'nz'}-maxt{max_tier}"
+
+class PuzzlePool():
+    def __init__(self, pool_dir):
+        self.pool_dir = pool_dir
+        self.buckets = {} # (puzzle_type, mta, options) -> list of puzzle lines
+        self.nbr_added = 0
+        self.nbr_taken = 0
+        os.makedirs(pool_dir, exist_ok=True)
+
+    def bucket_filename(self, puzzle_type, mta, options):
+        return os.path.join(self.pool_dir, f"{puzzle_type}-t{mta}-{options}.tsv")
+
+    def load_bucket(self, puzzle_type, mta, options):
+        key = (puzzle_type, mta, options)
+        if key not in self.buckets:
+            lines = []
+            fname = self.bucket_filename(puzzle_type, mta, options)
+            if os.path.exists(fname):
+                with open(fname, 'r') as f:
+                    lines = [line.rstrip('\n') for line in f if line.strip() and not line.startswith('#')]
+            self.buckets[key] = lines
+        return self.buckets[key]
+
+    def bucket_size(self, puzzle_type, mta, options):
+        return len(self.load_bucket(puzzle_type, mta, options))
+
+    def add(self, puzzle_rec, options):
+        """
+        Add a refined puzzle to the bucket for its type and tier, and the generator options (see 
+        pool_options) it was refined with.  Puzzles without an mta annotation (e.g. from the
+        OR solver) can't be bucketed and are ignored.
+        """
+        if 'mta' not in puzzle_rec.annotations:
+            return False
+        mta = puzzle_rec.annotations['mta']
+        line = str(puzzle_rec)
+        self.load_bucket(puzzle_rec.puzzle_type, mta, options).append(line)
+        # appended right away, so a long run doesn't lose its by-products if interrupted
+        with open(self.bucket_filename(puzzle_rec.puzzle_type, mta, options), 'a') as f:
+            f.write(line + "\n")
+        self.nbr_added += 1
+        return True
+
+    def take(self, puzzle_type, allow_zeros, min_tier, max_tier, max_clues=None, multi_tier=False):
+        """
+        Remove and return a puzzle of the given type with min_tier <= mta <= max_tier, and at most 
+        max_clues clues, which a run with these settings could have refined, or None if the pool 
+        has no such puzzle.  That's any bucket refined with a max tier of at least the run's
+        (for multi-tier runs, of at least the puzzle's mta), preferring the run's own.
+        (Clue counts are checked here, so buckets aren't split by --max_clues.)
+        """
+        for mta in range(min_tier, max_tier+1):
+            for refined_tier in range(mta if multi_tier else max_tier, MAX_TIER+1):
+                options = pool_options(allow_zeros, refined_tier)
+                bucket = self.load_bucket(puzzle_type, mta, options)
+                for i,line in enumerate(bucket):
+                    puzzle_rec = PuzzleRecord.parse_puzzle(line)
+                    if max_clues is not None and sum(1 for c in puzzle_rec.clues_string if c != '.') > max_clues:
+                        continue
+                    del bucket[i]
+                    self.save_bucket(puzzle_type, mta, options)
+                    self.nbr_taken += 1
+                    return puzzle_rec
+        return None
+
+    def save_bucket(self, puzzle_type, mta, options):
+        """Rewrite a bucket file, replacing the old one only once the new one is complete."""
+        fname = self.bucket_filename(puzzle_type, mta, options)
+        with open(fname + '.tmp', 'w') as f:
+            for line in self.buckets[puzzle_type,mta,options]:
+                f.write(line + "\n")
+        os.replace(fname + '.tmp', fname)
+
+if __name__ == "__main__":
+    import argparse
+    from glob import glob
+
+    parser = argparse.ArgumentParser(description='Show the contents of a puzzle pool')
+    parser.add_argument('pool_dir', type=str, nargs='?', default='./puzzlepool', help='Pool directory (default: %(default)s)')
+    args = parser.parse_args()
+
+    for fname in sorted(glob(os.path.join(args.pool_dir, '*-t*.tsv'))):
+        with open(fname, 'r') as f:
+            nbr_puzzles = sum(1 for line in f if line.strip() and not line.startswith('#'))
+        print(f"{os.path.basename(fname)}: {nbr_puzzles}")
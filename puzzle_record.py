@@ -1,28 +1,115 @@
 from layout_classic import Layout
 from layout_jiggy9 import Layout as JiggyLayout
+import ast
 import json
+from answer_sampler import AnswerSampler
 import random
 
+# Layouts parsed from puzzle files, shared by every record with the same (puzzle_type, layout_string),
+# so a book of classic puzzles has one layout, and anything cached on a layout (the answer sampler,
+# solve_OR's base model) is built once per distinct layout.  Shared layouts are treated as immutable:
+# their container lists are frozen into tuples.
+layout_cache = {}
+MAX_CACHED_LAYOUTS = 4096 # jigsaw files have a layout per puzzle
+
+def interned_layout(ptype, layout_string=None):
+    key = (ptype, layout_string)
+    layout = layout_cache.get(key)
+    if layout is None:
+        if 'jig' in ptype:
+            layout = JiggyLayout(9, ptype, layoutInit=layout_string)
+        else:
+            layout = Layout(9, ptype)
+        layout.containers = tuple(layout.containers)
+        layout.rows = tuple(layout.rows)
+        layout.cols = tuple(layout.cols)
+        layout.blocks = tuple(layout.blocks)
+        if len(layout_cache) >= MAX_CACHED_LAYOUTS:
+            del layout_cache[next(iter(layout_cache))]
+        layout = layout_cache.setdefault(key, layout)
+    return layout
+
 class PuzzleRecord():
+    # Records are made and solved in bulk when refining, so they are slotted, keep their clues in a
+    # bytearray (changed in place, and decoded to clues_string on demand), and only get an
+    # annotations dict when something annotates them.  Records parsed from a file keep their
+    # annotations column as text until they are first used.
+    __slots__ = ('clues', '_clues_string', 'layout', 'puzzle_type', '_annotations', 'answer_string', 'nom', 'solution', '_trial')
+
     def __init__(self, clues_string, layout, puzzle_type, nom='untitled-puzzle', answer_string=None):
         self.clues_string = clues_string
         self.layout = layout
         self.puzzle_type = puzzle_type
-        self.annotations = {}
+        self._annotations = None
         self.answer_string = answer_string
         self.nom = nom
         self.solution = None
+        self._trial = None
+
+    @property
+    def clues_string(self):
+        if self._clues_string is None:
+            self._clues_string = self.clues.decode('ascii')
+        return self._clues_string
+
+    @clues_string.setter
+    def clues_string(self, value):
+        self.clues = bytearray(value, 'ascii')
+        self._clues_string = value
+
+    @property
+    def annotations(self):
+        if self._annotations is None:
+            self._annotations = {}
+        elif isinstance(self._annotations, str):
+            self._annotations = self.parse_annotations(self._annotations)
+        return self._annotations
+
+    @annotations.setter
+    def annotations(self, value):
+        self._annotations = value
 
     def add_annotation(self, key, value):
         self.annotations[key] = value
 
     def change_clue(self, idx, value):
-        self.clues_string = self.clues_string[:idx] + value + self.clues_string[idx+1:]
+        """Change the clue at idx ('.' for none), and return the old one, so the change can be undone."""
+        old_value = chr(self.clues[idx])
+        self.clues[idx] = ord(value)
+        self._clues_string = None
+        return old_value
+
+    def try_change_clue(self, idx, value):
+        """
+        Change a clue for a trial solve, which is then kept (keep_change) or rolled back (undo_change).
+        Annotations made by the trial solve are kept apart from the record's own until it is kept.
+        """
+        annotations = self.annotations if self._annotations else None
+        self._trial = (idx, self.change_clue(idx, value), annotations, self.solution)
+        self._annotations = None
+
+    def keep_change(self):
+        idx, old_value, annotations, solution = self._trial
+        if self._annotations:
+            if annotations:
+                annotations.update(self._annotations)
+            else:
+                annotations = self._annotations
+        self._annotations = annotations
+        self._trial = None
+
+    def undo_change(self):
+        idx, old_value, self._annotations, self.solution = self._trial
+        self.change_clue(idx, old_value)
+        self._trial = None
 
     def clone(self):
         prec = PuzzleRecord(self.clues_string, self.layout, self.puzzle_type, self.nom, self.answer_string)
         prec.solution = self.solution
-        prec.annotations = self.annotations.copy()
+        if isinstance(self._annotations, str):
+            prec._annotations = self._annotations # still unparsed, so it can be shared
+        elif self._annotations:
+            prec._annotations = self._annotations.copy()
         return prec
         # return PuzzleRecord(self.clues_string, self.layout, self.puzzle_type, self.nom, self.answer_string)
 
@@ -36,6 +123,7 @@ class PuzzleRecord():
         Parse a line from a puzzle file and return a PuzzleRecord instance.
         Expects a tab-separated line with fields:
         nom, puzzle_type, [layout], clues_string, [answer_string], [annotations]
+        The annotations are only parsed when the record's annotations are first used.
         """
         parts = line.split('\t')
         nom = parts[0]
@@ -66,13 +154,27 @@ class PuzzleRecord():
             answer_str = None
         comment = '' # 'ans='+answer_str
 
-        if 'jig' in ptype:
-            # print("jigsaw puzzle", ptype, layout_string)
-            layout = JiggyLayout(9, ptype, layoutInit=layout_string)
-        else:
-            layout = Layout(9, ptype)
+        layout = interned_layout(ptype, layout_string)
 
-        return cls(puzzle_str, layout, ptype, nom, answer_str)
+        prec = cls(puzzle_str, layout, ptype, nom, answer_str)
+        if parts and parts[0].startswith('{'):
+            prec._annotations = parts[0].rstrip()
+        return prec
+
+    @staticmethod
+    def parse_annotations(annotation_string):
+        """
+        Parse an annotations column, which is json, or a python dict in older files.
+        Returns {} if it's neither.
+        """
+        try:
+            annotations = json.loads(annotation_string)
+        except ValueError:
+            try:
+                annotations = ast.literal_eval(annotation_string)
+            except (ValueError, SyntaxError):
+                return {}
+        return annotations if isinstance(annotations, dict) else {}
 
     @classmethod
     def setup_initial_clues(cls, sol, layout):
@@ -104,62 +206,19 @@ class PuzzleRecord():
 
     @classmethod
     def generate_candidate_answer(cls, layout, ptype, nom):
-        # ....
-        # localized for limesweeper - this is correct apparently
-        """Generate a valid Lime puzzle solution with exactly 3 circles per row/column/container."""
-
-        area = layout.area
-        num_symbols = layout.num_symbols
-
-        # Start with empty grid
-        solution = list('.' * area)
-        
-
-        # Try to place circles
-        attempts = 0
-        layout.containers_flat = [] # containers represented as linear addresses, rather than coordinate pairs
-        for cont in layout.containers:
-            layout.containers_flat.append([cy*num_symbols+cx for cx,cy in cont])
-        while True:
-            attempts += 1
-            if attempts > 1000:  # Prevent infinite loops
-                return None
-                
-            current_sol = list(solution) # clone it
-            placed_circles = 0
-
-            # Try to place 27 circles (3 per row)
-            valid_positions = set(range(81)) # set([(x, y) for x in range(num_symbols) for y in range(num_symbols)])
-            while placed_circles < 27:
-                for cont_flat in layout.containers_flat:
-                    if sum(1 for addr in cont_flat if current_sol[addr] == 'O') == 3:
-                        valid_positions -= set(cont_flat)
-                if len(valid_positions) == 0:
-                    break
-                
-                # convert to list
-                pos = random.choice(list(valid_positions))
-                current_sol[pos] = 'O'
-                valid_positions.discard(pos)
-                placed_circles += 1
-                
-            # will only execute if we didn't break (which means we have 27 circles)
-            else:
-                # confirm that each container contains exactly 3 circles
-                bad_puzzle = False
-                for cont_flat in layout.containers_flat:
-                    if sum(1 for addr in cont_flat if current_sol[addr] == 'O') != 3:
-                        bad_puzzle = True
-                        break
-                if not bad_puzzle:
-                    return current_sol
-
-            # If we didn't get a valid solution, the loop continues to execute
-        
+        """
+        Generate a valid Lime puzzle solution with exactly 3 circles per row/column/container.
+        Returns None if the sampler's search budget runs out (most likely an infeasible jigsaw+X layout).
+        """
+        # the sampler's container masks are cached on the layout, which is reused for classic puzzles
+        if getattr(layout, 'answer_sampler', None) is None:
+            layout.answer_sampler = AnswerSampler(layout)
+        return layout.answer_sampler.sample()
 
     @classmethod
-    def generate_candidate_puzzle(cls, layout, ptype, nom, allow_zeros=False):
-        answer = cls.generate_candidate_answer(layout, ptype, nom)
+    def generate_candidate_puzzle(cls, layout, ptype, nom, allow_zeros=False, answer=None):
+        if answer is None:
+            answer = cls.generate_candidate_answer(layout, ptype, nom)
         if answer == None or len(answer) != 81:
             # we likely have a bad jigsaw+X layout, return none, and the generator will make a new jigsaw layout
             # print("bad layout?") # in testing, this happens occasionally (0.5%) on jigsaw-windowed , which is acceptable
@@ -170,4 +229,22 @@ class PuzzleRecord():
             initial_puz_str = initial_puz_str.replace('0', '.')
         # print("candidate puzzle", initial_puz_str, answer, layout.containers)
         prec = cls(initial_puz_str, layout, ptype, nom=nom, answer_string=''.join(answer))
-        return prec
\ No newline at end of file
+        return prec
+
+    @classmethod
+    def generate_candidate_puzzles(cls, layout, ptype, count, allow_zeros=False, answers=None, nom_prefix='puzzle'):
+        """
+        Generate count candidate puzzles on a layout (or one per given answer), computing all their
+        clues in one numpy pass.  Answers the sampler fails to find are left out.
+        """
+        from batch_clues import answers_to_array, clue_strings
+
+        if answers is None:
+            answers = [cls.generate_candidate_answer(layout, ptype, f"{nom_prefix}-{i+1}") for i in range(count)]
+        answers = [answer for answer in answers if answer is not None and len(answer) == layout.area]
+        if not answers:
+            return []
+        answer_strings = [''.join(answer) for answer in answers]
+        clue_strs = clue_strings(answers_to_array(answer_strings), allow_zeros=allow_zeros)
+        return [cls(clue_str, layout, ptype, nom=f"{nom_prefix}-{i+1}", answer_string=answer_str)
+                for i,(clue_str, answer_str) in enumerate(zip(clue_strs, answer_strings))]
@@ -0,0 +1,231 @@
+# puzzle_store.py
+#
+# A compact binary puzzle file, with random access by puzzle number (and so by book), for the
+# readers which would otherwise re-parse a whole TSV file to reach the puzzles they want.
+#
+# File format: a 64 byte header (magic, version, count, number of layouts, and the offsets of the
+# layout table, the records and the heap), then:
+#   layout table  one entry per distinct (puzzle type, layout string), 32 bytes of puzzle type
+#                 and 81 bytes of block letters (blank for non-jigsaw types)
+#   records       fixed size, so record i is at records_offset + i * RECORD_SIZE (the offset index):
+#                 41 bytes of clues (4 bits per cell, 0 for '.', else the clue + 1), 11 bytes of
+#                 answer mask (81 bits, all zero if there's no answer), the layout id, the packed
+#                 work and mta annotations, and the offset and length of the record's heap entry
+#   heap          per record, utf-8 nom + tab + json of the other annotations (e.g. logic_history),
+#                 and at the very end, the file's comment lines as json, to give the tsv back
+# The file is memory mapped, and records are only decoded when read.
+#
+# python puzzle_store.py pack puzzledata/lime-easy-V1.tsv lime-easy-V1.lps
+# python puzzle_store.py unpack lime-easy-V1.lps lime-easy-V1.tsv
+# python puzzle_store.py info lime-easy-V1.lps
+
+import json
+import mmap
+import struct
+from puzzle_record import PuzzleRecord, interned_layout
+
+MAGIC = b'LIMEPUZZ'
+VERSION = 1
+HEADER_FORMAT = '<8sIIIIII32x'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+LAYOUT_FORMAT = '<32s81s'
+LAYOUT_SIZE = struct.calcsize(LAYOUT_FORMAT)
+RECORD_FORMAT = '<41s11sHHBII'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+NUM_SYMBOLS = 9
+AREA = NUM_SYMBOLS * NUM_SYMBOLS
+NO_WORK = 0xffff
+NO_MTA = 0xff
+
+def is_puzzle_store(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def pack_clues(clues_string):
+    nibbles = [0 if c == '.' else int(c) + 1 for c in clues_string] + [0]
+    return bytes(nibbles[i] | (nibbles[i+1] << 4) for i in range(0, AREA, 2))
+
+def unpack_clues(packed):
+    chars = []
+    for b in packed:
+        chars.append('.' if b & 15 == 0 else str((b & 15) - 1))
+        chars.append('.' if b >> 4 == 0 else str((b >> 4) - 1))
+    return ''.join(chars[:AREA])
+
+def pack_answer(answer_string):
+    if not answer_string:
+        return bytes(11)
+    return sum(1 << addr for addr,c in enumerate(answer_string) if c == 'O').to_bytes(11, 'little')
+
+def unpack_answer(packed):
+    mask = int.from_bytes(packed, 'little')
+    if not mask:
+        return None
+    return ''.join('O' if (mask >> addr) & 1 else '.' for addr in range(AREA))
+
+def read_tsv(filename):
+    """Read a puzzle tsv file, returning (list of PuzzleRecords, list of (puzzle index, comment line))."""
+    puzzles = []
+    comments = []
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                comments.append((len(puzzles), line))
+                continue
+            puzzles.append(PuzzleRecord.parse_puzzle(line))
+    return puzzles, comments
+
+def write_store(filename, puzzles, comments=()):
+    layout_ids = {}
+    records = []
+    heap = bytearray()
+    for puzrec in puzzles:
+        layout_key = (puzrec.puzzle_type, puzrec.layout.layout if 'jig' in puzrec.puzzle_type else '')
+        layout_id = layout_ids.setdefault(layout_key, len(layout_ids))
+        annotations = dict(puzrec.annotations)
+        work = annotations.get('work')
+        if type(work) is int and 0 <= work < NO_WORK:
+            del annotations['work']
+        else:
+            work = NO_WORK
+        mta = annotations.get('mta')
+        if type(mta) is int and 0 <= mta < NO_MTA:
+            del annotations['mta']
+        else:
+            mta = NO_MTA
+        entry = (puzrec.nom + '\t' + (json.dumps(annotations) if annotations else '')).encode('utf-8')
+        records.append(struct.pack(RECORD_FORMAT, pack_clues(puzrec.clues_string), pack_answer(puzrec.answer_string),
+                                   layout_id, work, mta, len(heap), len(entry)))
+        heap += entry
+    comments_offset = len(heap)
+    heap += json.dumps(list(comments)).encode('utf-8')
+
+    layouts_offset = HEADER_SIZE
+    records_offset = layouts_offset + len(layout_ids) * LAYOUT_SIZE
+    heap_offset = records_offset + len(records) * RECORD_SIZE
+    with open(filename, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(records), len(layout_ids), records_offset, heap_offset, comments_offset))
+        for ptype, layout_string in layout_ids:
+            f.write(struct.pack(LAYOUT_FORMAT, ptype.encode('ascii'), layout_string.encode('ascii')))
+        f.write(b''.join(records))
+        f.write(heap)
+
+class PuzzleStore():
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, nbr_layouts, self.records_offset, self.heap_offset, self.comments_offset = struct.unpack_from(HEADER_FORMAT, self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a puzzle store")
+        self.layout_keys = []
+        for i in range(nbr_layouts):
+            ptype, layout_string = struct.unpack_from(LAYOUT_FORMAT, self.mm, HEADER_SIZE + i * LAYOUT_SIZE)
+            self.layout_keys.append((ptype.rstrip(b'\0').decode('ascii'), layout_string.rstrip(b'\0').decode('ascii')))
+
+    def __len__(self):
+        return self.count
+
+    def layout(self, layout_id):
+        ptype, layout_string = self.layout_keys[layout_id]
+        return interned_layout(ptype, layout_string or None)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.count
+        if not 0 <= idx < self.count:
+            raise IndexError(f"puzzle index {idx} out of range")
+        clues, answer, layout_id, work, mta, entry_offset, entry_len = struct.unpack_from(RECORD_FORMAT, self.mm, self.records_offset + idx * RECORD_SIZE)
+        start = self.heap_offset + entry_offset
+        nom, annotation_string = self.mm[start:start+entry_len].decode('utf-8').split('\t', 1)
+        annotations = {}
+        if work != NO_WORK:
+            annotations['work'] = work
+        if mta != NO_MTA:
+            annotations['mta'] = mta
+        if annotation_string:
+            annotations.update(json.loads(annotation_string))
+        ptype = self.layout_keys[layout_id][0]
+        puzrec = PuzzleRecord(unpack_clues(clues), self.layout(layout_id), ptype, nom, unpack_answer(answer))
+        puzrec.annotations = annotations
+        return puzrec
+
+    def puzzles(self, offset=0, count=None):
+        """Puzzles offset, offset+1... (up to count of them)"""
+        end = self.count if count is None else min(self.count, offset + count)
+        return [self[idx] for idx in range(offset, end)]
+
+    def book(self, book, puzzles_per_book):
+        """The puzzles in book number book (counting from 1)"""
+        return self.puzzles((book - 1) * puzzles_per_book, puzzles_per_book)
+
+    def comments(self):
+        start = self.heap_offset + self.comments_offset
+        return [tuple(c) for c in json.loads(self.mm[start:].decode('utf-8'))]
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+def write_tsv(filename, store):
+    comments = store.comments()
+    with open(filename, 'w') as f:
+        ci = 0
+        for idx in range(len(store)):
+            while ci < len(comments) and comments[ci][0] <= idx:
+                f.write(comments[ci][1] + '\n')
+                ci += 1
+            f.write(str(store[idx]) + '\n')
+        for _, line in comments[ci:]:
+            f.write(line + '\n')
+
+def read_puzzles(filename, offset=0, count=None):
+    """
+    Read puzzles offset, offset+1... (up to count of them) from a puzzle store or a tsv file.
+    Only the wanted records are decoded from a store; a tsv file is parsed up to the last one.
+    """
+    if is_puzzle_store(filename):
+        store = PuzzleStore(filename)
+        puzzles = store.puzzles(offset, count)
+        store.close()
+        return puzzles
+    puzzles = []
+    with open(filename, 'r') as f:
+        pctr = 0
+        for line in f:
+            if not line.strip() or line[0] == '#':
+                continue
+            pctr += 1
+            if pctr <= offset:
+                continue
+            puzzles.append(PuzzleRecord.parse_puzzle(line))
+            if count and len(puzzles) == count:
+                break
+    return puzzles
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert puzzle files to and from the binary puzzle store')
+    parser.add_argument('command', choices=['pack', 'unpack', 'info'], help='tsv to store, store to tsv, or show a store')
+    parser.add_argument('ifilename', help='Input file')
+    parser.add_argument('ofilename', nargs='?', help='Output file (for pack and unpack)')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        if not args.ofilename:
+            parser.error("pack needs an output file")
+        puzzles, comments = read_tsv(args.ifilename)
+        write_store(args.ofilename, puzzles, comments)
+        print(f"Wrote {len(puzzles)} puzzles to {args.ofilename}")
+    elif args.command == 'unpack':
+        if not args.ofilename:
+            parser.error("unpack needs an output file")
+        store = PuzzleStore(args.ifilename)
+        write_tsv(args.ofilename, store)
+        print(f"Wrote {len(store)} puzzles to {args.ofilename}")
+    else:
+        store = PuzzleStore(args.ifilename)
+        print(f"{args.ifilename}: {len(store)} puzzles, {len(store.layout_keys)} layouts")
+        for idx in range(min(len(store), 5)):
+            print(store[idx])
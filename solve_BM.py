@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#
+# solve_BM.py - exact solution counter using 81-bit masks, in plain python (no OR-Tools, so it
+# runs under PyPy).  Same interface as solve_OR: solve() returns the solution, or "no solution"
+# or "multiple solutions", and a 'branches' stat.
+#
+# Every container (3 mines) and every clue (its count of mines among the surrounding cells) is a
+# constraint on a mask of cells, with a count of mines still to place.  Propagation closes the open
+# cells of constraints with nothing left to place, fills constraints with exactly as many open
+# cells as mines left, and fails constraints with too few.  Search branches on an open cell of the
+# constraint with the fewest spare open cells, trying mine then no mine.
+
+import time
+
+popcount = getattr(int, 'bit_count', None) or (lambda mask: bin(mask).count('1'))
+
+def get_adjacent_addrs(addr):
+    """Addresses of the (up to 8) cells around a cell."""
+    row, col = addr // 9, addr % 9
+    return [(row+dr)*9 + col+dc for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+            if (dr or dc) and 0 <= row+dr < 9 and 0 <= col+dc < 9]
+
+ADJACENT_MASKS = [sum(1 << a for a in get_adjacent_addrs(addr)) for addr in range(81)]
+
+default_options = {
+    'max_solutions': 2,
+    'verbose': False
+}
+
+class BitmaskCounter():
+    def __init__(self, puzzle_string, layout):
+        # the container masks are cached on the layout, which parsed puzzles share
+        if getattr(layout, 'container_masks', None) is None:
+            layout.container_masks = tuple(sum(1 << (y*9+x) for x,y in cont) for cont in layout.containers)
+        self.masks = list(layout.container_masks)
+        self.needs = [3] * len(self.masks)
+        self.open_cells = (1 << 81) - 1
+        for addr,ch in enumerate(puzzle_string):
+            if ch in '012345678':
+                # no mines on clues
+                self.open_cells &= ~(1 << addr)
+                self.masks.append(ADJACENT_MASKS[addr])
+                self.needs.append(int(ch))
+        self.cell_constraints = [[ci for ci,mask in enumerate(self.masks) if (mask >> addr) & 1] for addr in range(81)]
+        self.branches = 0
+        self.solutions = []
+
+    def propagate(self, open_cells, mines, remaining, dirty):
+        """
+        Propagate from the constraints in dirty until nothing changes.  remaining is updated in place.
+
+        Returns:
+            (open_cells, mines), or None if a constraint can't be met
+        """
+        masks = self.masks
+        cell_constraints = self.cell_constraints
+        while dirty:
+            ci = dirty.pop()
+            need = remaining[ci]
+            if need < 0:
+                return None
+            avail = open_cells & masks[ci]
+            if not avail:
+                if need:
+                    return None
+                continue
+            if need == 0:
+                # close the rest of this constraint's cells
+                open_cells &= ~avail
+            else:
+                nbr_avail = popcount(avail)
+                if nbr_avail < need:
+                    return None
+                if nbr_avail > need:
+                    continue
+                # every open cell here is a mine
+                open_cells &= ~avail
+                mines |= avail
+                m = avail
+                while m:
+                    low = m & -m
+                    for cj in cell_constraints[low.bit_length() - 1]:
+                        remaining[cj] -= 1
+                    m ^= low
+            m = avail
+            while m:
+                low = m & -m
+                dirty.update(cell_constraints[low.bit_length() - 1])
+                m ^= low
+        return open_cells, mines
+
+    def branch_cell(self, open_cells, remaining):
+        """An open cell in the constraint with the fewest spare open cells."""
+        best_avail = 0
+        best_spare = 82
+        for ci,mask in enumerate(self.masks):
+            avail = open_cells & mask
+            if avail and remaining[ci]:
+                spare = popcount(avail) - remaining[ci]
+                if spare < best_spare:
+                    best_spare = spare
+                    best_avail = avail
+                    if spare == 1:
+                        break
+        if not best_avail:
+            # only constraints with nothing left to place, propagation will close these
+            best_avail = open_cells
+        return (best_avail & -best_avail).bit_length() - 1
+
+    def search(self, open_cells, mines, remaining, dirty, limit):
+        state = self.propagate(open_cells, mines, remaining, dirty)
+        if state is None:
+            return
+        open_cells, mines = state
+        if not open_cells:
+            self.solutions.append(mines)
+            return
+
+        addr = self.branch_cell(open_cells, remaining)
+        bit = 1 << addr
+        self.branches += 1
+
+        # mine...
+        mine_remaining = remaining.copy()
+        for ci in self.cell_constraints[addr]:
+            mine_remaining[ci] -= 1
+        self.search(open_cells & ~bit, mines | bit, mine_remaining, set(self.cell_constraints[addr]), limit)
+        if len(self.solutions) >= limit:
+            return
+        # ...or no mine
+        self.search(open_cells & ~bit, mines, remaining.copy(), set(self.cell_constraints[addr]), limit)
+
+    def count(self, limit=2):
+        """Find up to limit solutions (as mine masks) and return how many were found."""
+        self.branches = 0
+        self.solutions = []
+        self.search(self.open_cells, 0, self.needs.copy(), set(range(len(self.masks))), limit)
+        return len(self.solutions)
+
+def mask_to_string(mines):
+    return ''.join('O' if (mines >> addr) & 1 else '.' for addr in range(81))
+
+def count_solutions(puzzle_rec, limit=2):
+    """
+    Returns:
+        (number of solutions found, up to limit, list of solution strings, branches)
+    """
+    counter = BitmaskCounter(puzzle_rec.clues_string, puzzle_rec.layout)
+    nbr_solutions = counter.count(limit)
+    return nbr_solutions, [mask_to_string(mines) for mines in counter.solutions], counter.branches
+
+def solve(puzzle_rec, options = {}):
+    """
+    Solve a Lime Sudoku puzzle by exact search.
+
+    Returns:
+        Either a solved puzzle string (with 'O' for limes) or
+        "no solution" or "multiple solutions", and the stats
+    """
+    myoptions = default_options.copy()
+    myoptions.update(options)
+    if len(puzzle_rec.clues_string) != 81:
+        return "no solution", None
+
+    nbr_solutions, solutions, branches = count_solutions(puzzle_rec, myoptions['max_solutions'])
+    if nbr_solutions == 0:
+        return "no solution", None
+    elif nbr_solutions > 1:
+        return "multiple solutions", None
+    return solutions[0], {'branches': branches}
+
+if __name__ == "__main__":
+    """Test the solver with the sample puzzle."""
+    from puzzle_record import PuzzleRecord
+    from layout_classic import Layout
+    sample_puzzle = ".21.......3.3...........3...34.....3...........4....4.2...3.4.................4.."
+    print("Solving puzzle with the bitmask solver...", sample_puzzle)
+    start_time = time.perf_counter()
+    result,stats = solve(PuzzleRecord(sample_puzzle, Layout(9, 'lime'), 'lime'))
+    print(f"{result=} {stats=} in {time.perf_counter()-start_time:.4f} seconds")
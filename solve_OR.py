@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 from ortools.sat.python import cp_model
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
 import time
 
 # jbum added this class to get callback for each solution, and quit when 2 solutions are found
@@ -34,6 +38,54 @@ def get_adjacent_positions(row, col):
                 positions.append((nr, nc))
     return positions
 
+# cell addresses around each cell, for the clue constraints
+ADJACENT_ADDRS = [[r*9+c for r,c in get_adjacent_positions(addr // 9, addr % 9)] for addr in range(81)]
+
+# Base models by layout: the cell variables and container constraints, which only depend on the layout.
+# A layout's first solve builds its model and adds the clue constraints to it directly; from its second
+# solve on, the base model is cached and each solve clones it and adds just the clue constraints.
+# (Jigsaw files have a layout per puzzle, so caching on first sight would only add a clone per solve.
+# Clue constraints as enforcement literals on the base model, switched on with assumptions,
+# avoid the per-solve adds but the 729 extra literals made the solves themselves slower.)
+base_models = {}
+seen_layouts = {} # layouts solved once, cached if they come back
+base_models_lock = threading.Lock() # solves may run on several threads (CP-SAT releases the GIL)
+MAX_BASE_MODELS = 64 # jigsaw generation makes a new layout per candidate
+MAX_SEEN_LAYOUTS = 1024
+
+def build_base_model(layout):
+    """Return (model, flat_board) with the layout's cell variables and container constraints."""
+    model = cp_model.CpModel()
+    # boolean variables for each cell (1 = mine, 0 = no mine)
+    flat_board = [model.NewBoolVar(f'mine_{row}_{col}') for row in range(9) for col in range(9)]
+    # Container constraints: Each container (row, column, block, etc) must have exactly 3 mines
+    for cont in layout.containers:
+        model.Add(sum(flat_board[y*9+x] for x,y in cont) == 3)
+    return model, flat_board
+
+def layout_model(layout):
+    """Return (model, flat_board) for a layout, for a solve to add its clue constraints to."""
+    key = tuple(layout.containers)
+    with base_models_lock:
+        cached = base_models.get(key)
+        if cached is None:
+            seen = seen_layouts.pop(key, False)
+            if not seen:
+                if len(seen_layouts) >= MAX_SEEN_LAYOUTS:
+                    del seen_layouts[next(iter(seen_layouts))]
+                seen_layouts[key] = True
+    if cached is not None:
+        model, flat_board = cached
+        return model.clone(), flat_board
+    model, flat_board = build_base_model(layout)
+    if not seen:
+        return model, flat_board
+    with base_models_lock:
+        if len(base_models) >= MAX_BASE_MODELS:
+            del base_models[next(iter(base_models))]
+        base_models[key] = (model, flat_board)
+    return model.clone(), flat_board
+
 def vals_to_string(sol):
     """Convert 2D grid to string representation."""
     return ''.join(['.' if sol[_] == 0 else 'O' for _ in range(81)])
@@ -41,9 +93,24 @@ def vals_to_string(sol):
 default_options = {
     'rand_seed': int(time.time()),
     'max_solutions': 2,
-    'verbose': False
+    'verbose': False,
+    'known_answer': False, # check uniqueness against puzzle_rec.answer_string, see below
+    'num_workers': 0 # CP-SAT workers per solve (0 = one per core)
 }
 
+def answer_fits_puzzle(puzzle_string, answer_string, layout):
+    """True if the answer has 3 mines in every container, none on clues, and matches every clue's count."""
+    for cont in layout.containers:
+        if sum(1 for x,y in cont if answer_string[y*9+x] == 'O') != 3:
+            return False
+    for addr,ch in enumerate(puzzle_string):
+        if ch in '012345678':
+            if answer_string[addr] == 'O':
+                return False
+            if sum(1 for a in ADJACENT_ADDRS[addr] if answer_string[a] == 'O') != int(ch):
+                return False
+    return True
+
 def solve(puzzle_rec, options = {}):
     """
     Solve a Lime Sudoku puzzle using OR-Tools SAT solver.
@@ -55,6 +122,11 @@ def solve(puzzle_rec, options = {}):
     Returns:
         Either a solved puzzle string (with 'O' for limes) or
         "no solution" or "multiple solutions"
+
+    With options['known_answer'] and an answer_string on the record, uniqueness is a single check
+    for any solution which differs from the answer in at least one cell.  That doesn't need solution
+    enumeration, so presolve and multi-worker search stay on.  A "multiple solutions" result then
+    comes with the other solution, as stats['counter_example'].
     """
     puzzle_string = puzzle_rec.clues_string
     layout = puzzle_rec.layout
@@ -71,44 +143,39 @@ def solve(puzzle_rec, options = {}):
     if len(puzzle_string) != 81:
         return "no solution"
     
-    # Create the model
-    model = cp_model.CpModel()
-    
-    # Create boolean variables for each cell (1 = mine, 0 = no mine)
-    cells = {}
-    flat_board = []
-    for row in range(9):
-        for col in range(9):
-            cells[row, col] = model.NewBoolVar(f'mine_{row}_{col}')
-            flat_board.append(cells[row, col])
-    
-    # Container constraints: Each container (row, column, block, etc) must have exactly 3 mines
-    for cont in layout.containers:
-        cont_cells = [cells[y, x] for x,y in cont]
-        model.Add(sum(cont_cells) == 3)
-    
+    model, flat_board = layout_model(layout)
+
     # Clue constraints: adjacent mine counts must match clues
-    addr = 0
-    for row in range(9):
-        for col in range(9):
-            if puzzle_string[addr] in '012345678':
-                expected_count = int(puzzle_string[addr])
-                adjacent_cells = []
-                
-                # Get all adjacent positions
-                for adj_row, adj_col in get_adjacent_positions(row, col):
-                    adjacent_cells.append(cells[adj_row, adj_col])
-                
-                # Add constraint that sum of adjacent mines equals the clue
-                model.Add(sum(adjacent_cells) == expected_count)
-                # jim - added this constraint to prevent solutions with mines on clued cells
-                model.Add(cells[row, col] == 0)
-            addr += 1
-    
+    for addr in range(81):
+        if puzzle_string[addr] in '012345678':
+            model.Add(sum(flat_board[a] for a in ADJACENT_ADDRS[addr]) == int(puzzle_string[addr]))
+            # jim - added this constraint to prevent solutions with mines on clued cells
+            model.Add(flat_board[addr] == 0)
+
+    if myoptions['known_answer'] and known_answer_str and len(known_answer_str) == 81:
+        if not answer_fits_puzzle(puzzle_string, known_answer_str, layout):
+            # shouldn't happen for generated puzzles, fall back to enumerating solutions
+            if verbose:
+                print("answer doesn't fit the puzzle, enumerating solutions")
+        else:
+            # at least one cell differs from the answer, on a copy so a fallback enumerates the puzzle itself
+            differs_model = model.clone()
+            differs_model.AddBoolOr([flat_board[addr].Not() if known_answer_str[addr] == 'O' else flat_board[addr] for addr in range(81)])
+            solver = cp_model.CpSolver()
+            solver.parameters.random_seed = rand_seed
+            solver.parameters.num_workers = myoptions['num_workers']
+            status = solver.Solve(differs_model)
+            if status == cp_model.INFEASIBLE:
+                return known_answer_str, {'branches': solver.NumBranches()}
+            if status in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+                return "multiple solutions", {'counter_example': vals_to_string([solver.Value(p) for p in flat_board])}
+            # UNKNOWN/MODEL_INVALID, fall back to enumerating solutions
+
     # Solve the model
     solver = cp_model.CpSolver()
     solution_printer = MySolutionChecker(flat_board, max_solutions)
     solver.parameters.enumerate_all_solutions = True # this is hugely important
+    solver.parameters.num_workers = myoptions['num_workers']
 
     solver.parameters.random_seed = rand_seed
 
@@ -121,6 +188,28 @@ def solve(puzzle_rec, options = {}):
     return vals_to_string(solution_printer.solution_set()[0]), {'branches': solver.NumBranches()}
 
 
+def solve_batch(puzzle_recs, options = {}, threads = None):
+    """
+    Solve many puzzles on a thread pool, yielding (puzzle_rec, result, stats) in input order.
+    CP-SAT releases the GIL while it searches, so this scales across cores without processes;
+    each solve gets a single CP-SAT worker (unless options say otherwise), and the layouts'
+    base models are shared between threads.  puzzle_recs can be any iterable, only a few
+    solves per thread are queued ahead of the results.
+    """
+    threads = threads or os.cpu_count() or 1
+    batch_options = {'num_workers': 1}
+    batch_options.update(options)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for puzzle_rec in puzzle_recs:
+            pending.append((puzzle_rec, executor.submit(solve, puzzle_rec, batch_options)))
+            if len(pending) >= threads * 4:
+                puzzle_rec, future = pending.popleft()
+                yield (puzzle_rec,) + tuple(future.result())
+        while pending:
+            puzzle_rec, future = pending.popleft()
+            yield (puzzle_rec,) + tuple(future.result())
+
 if __name__ == "__main__":
     """Test the solver with the sample puzzle."""
     sample_puzzle = ".21.......3.3...........3...34.....3...........4....4.2...3.4.................4.."
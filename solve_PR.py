@@ -59,6 +59,11 @@ class PuzzleBoard:
         self.very_verbose = very_verbose
         self.clue_addresses = []
         self.max_subgroup_split_depth = 0
+        # solve progress, accumulated across resumed solves (see add_clue)
+        self.work = 0
+        self.max_tier_encountered = 0
+        self.logic_history = []
+        self.last_rule_used = None
 
         for i in range(self.area):
             x,y = i % self.gw, i // self.gw
@@ -81,6 +86,26 @@ class PuzzleBoard:
     def clone(self):
         return PuzzleBoard(self.puzzle_rec, self.verbose)
 
+    def add_clue(self, x, y, clue):
+        """
+        Add a clue to a board which may already be partially solved.  Since a new clue only adds
+        information, every deduction made so far remains valid, and solving can resume from the 
+        stuck state (see resume) instead of restarting.  The puzzle record is updated to match.
+        """
+        cell = self.board[x,y]
+        if cell.clue is not None:
+            return False
+        if cell.value == CELL_MINE:
+            raise Exception(f'clue added to mine: x={x} y={y} {clue=}')
+        cell.clue = clue
+        cell.value = CELL_EMPTY
+        cell.clue_solved = False
+        self.clue_addresses.append((x,y))
+        addr = y * self.gw + x
+        self.puzzle_rec.change_clue(addr, str(clue))
+        self.puzzle_str = self.puzzle_rec.clues_string
+        return True
+
     def clear_cell(self, x, y, why='generic_reason'):
         if self.board[x,y].value == CELL_EMPTY:
             return False
@@ -1117,6 +1142,58 @@ default_options = {
     # 'ptype': 'lime'
 }
 
+def apply_production_rules(board, max_tier=None, very_verbose=False, step_callback=None):
+    """
+    Apply production rules to the board until it is solved, or no further progress can be made.
+    Work, max tier and logic history accumulate on the board, so this can be called again on
+    a stuck board after add_clue.  Returns True if the board is solved.
+    """
+    while True:
+        if board.solution_found():
+            return True
+        made_progress = False
+        for rule in production_rules:
+            if very_verbose:
+              print(f"checking rule {rule['nom']}")
+            if max_tier is not None and rule['tier'] > max_tier:
+                continue
+            if rule['function'](board):
+                made_progress = True
+                board.max_tier_encountered = max(board.max_tier_encountered, rule['tier'])
+                board.work += rule['score']
+                board.last_rule_used = rule['nom']
+                board.logic_history.append(rule['shortnom'])
+                break
+        if step_callback:
+            step_callback(board, board.last_rule_used if made_progress else "no progress")
+        if not made_progress:
+            return False
+
+def annotate_solve(board, solution_found, draw_unsolved=False):
+    """
+    Record the outcome of a (possibly resumed) solve on the board's puzzle record.
+    Returns the solution string (or "no solution") and the annotations.
+    """
+    puzzle_rec = board.puzzle_rec
+    nom = puzzle_rec.nom
+    if solution_found:
+        sol_string_found = board.solution_string_found()
+        if puzzle_rec.answer_string is not None and sol_string_found != puzzle_rec.answer_string:
+            raise Exception(f'solution found but does not match known answer: {sol_string_found=} {puzzle_rec.answer_string=}')
+    else:
+        sol_string_found = "no solution"
+        if draw_unsolved:
+            partial_solution_str = board.solution_string_found()
+            # print(f"drawing {board.puzzle_str=} {solution_str=} {annotation=}")
+            draw_puzzle(f"drawings/unsolved_{nom}.png", board.puzzle_rec, answer_string=partial_solution_str, annotation=f"{nom} unsolved")
+    logic_history_str = ",".join(board.logic_history)
+    puzzle_rec.add_annotation('work', board.work+10*board.max_subgroup_split_depth)
+    puzzle_rec.add_annotation('mta', board.max_tier_encountered)
+    puzzle_rec.add_annotation('logic_history', logic_history_str)
+    # puzzle_rec.add_annotation('max_subgroup_split_depth', board.max_subgroup_split_depth)
+    puzzle_rec.solution = sol_string_found
+    return sol_string_found, puzzle_rec.annotations # , 'mbsd':board.max_subgroup_split_depth}
+
 def solve(puzzle_rec, options = {}):
     global last_solution_str
 
@@ -1129,9 +1206,6 @@ def solve(puzzle_rec, options = {}):
     verbose = myoptions['verbose']
     very_verbose = myoptions['very_verbose']
     draw_unsolved = myoptions['draw_unsolved']
-    nom = puzzle_rec.nom
-    ptype = puzzle_rec.puzzle_type
-    max_tier_encountered = 0
 
     last_solution_str = None
 
@@ -1145,55 +1219,16 @@ def solve(puzzle_rec, options = {}):
 
     board = PuzzleBoard(puzzle_rec, verbose=verbose, very_verbose=very_verbose)
 
-    logic_history = []
     if very_verbose:
         print("Solve call")
     try:
-        solution_found = False
-        work = 0
-        last_rule_used = None
+        step_callback = None
         if draw_steps:
             draw_solve_step(board, annotation="opening", bestiary_draw=bestiary_draw, inhibit_annotations=inhibit_annotations)
+            step_callback = lambda board, annotation: draw_solve_step(board, annotation=annotation, bestiary_draw=bestiary_draw, inhibit_annotations=inhibit_annotations)
 
-
-        while True:
-            if board.solution_found():
-                solution_found = True
-                break
-            made_progress = False
-            for rule in production_rules:
-                if very_verbose:
-                  print(f"checking rule {rule['nom']}")
-                if max_tier is not None and rule['tier'] > max_tier:
-                    continue
-                if rule['function'](board):
-                    made_progress = True
-                    max_tier_encountered = max(max_tier_encountered, rule['tier'])
-                    work += rule['score']
-                    last_rule_used = rule['nom']
-                    logic_history.append(rule['shortnom'])
-                    break
-            if draw_steps:
-                draw_solve_step(board, annotation=last_rule_used if made_progress else "no progress", bestiary_draw=bestiary_draw, inhibit_annotations=inhibit_annotations)
-            if not made_progress:
-                break
-        if solution_found:
-            sol_string_found = board.solution_string_found()
-            if puzzle_rec.answer_string is not None and sol_string_found != puzzle_rec.answer_string:
-                raise Exception(f'solution found but does not match known answer: {sol_string_found=} {puzzle_rec.answer_string=}')
-        else:
-            sol_string_found = "no solution"
-            if draw_unsolved:
-                partial_solution_str = board.solution_string_found()
-                # print(f"drawing {board.puzzle_str=} {solution_str=} {annotation=}")
-                draw_puzzle(f"drawings/unsolved_{nom}.png", board.puzzle_rec, answer_string=partial_solution_str, annotation=f"{nom} unsolved")
-        logic_history_str = ",".join(logic_history)
-        puzzle_rec.add_annotation('work', work+10*board.max_subgroup_split_depth)
-        puzzle_rec.add_annotation('mta', max_tier_encountered)
-        puzzle_rec.add_annotation('logic_history', logic_history_str)
-        # puzzle_rec.add_annotation('max_subgroup_split_depth', board.max_subgroup_split_depth)
-        puzzle_rec.solution = sol_string_found
-        return sol_string_found, puzzle_rec.annotations # , 'mbsd':board.max_subgroup_split_depth}
+        solution_found = apply_production_rules(board, max_tier=max_tier, very_verbose=very_verbose, step_callback=step_callback)
+        return annotate_solve(board, solution_found, draw_unsolved=draw_unsolved)
     except Exception as e:
         print(f'PR Solve error: {e}')
         import traceback
@@ -1202,6 +1237,30 @@ def solve(puzzle_rec, options = {}):
 
     assert False # should never get here
 
+def start_resumable_solve(puzzle_rec, options = {}):
+    """
+    Like solve, but also returns the board, so that clues can be added to it with 
+    board.add_clue and the solve continued with resume.
+    Returns (solution string or "no solution", annotations, board)
+    """
+    myoptions = default_options.copy()
+    myoptions.update(options)
+    board = PuzzleBoard(puzzle_rec, verbose=myoptions['verbose'], very_verbose=myoptions['very_verbose'])
+    result, stats = resume(board, options)
+    return result, stats, board
+
+def resume(board, options = {}):
+    """
+    Continue solving a board from its current (stuck) state, typically after board.add_clue.
+    Work and logic history include the steps taken before the resume.
+    Solver errors (e.g. a mismatch with the known answer) are raised, as the board can't be
+    carried on with after them.
+    """
+    myoptions = default_options.copy()
+    myoptions.update(options)
+    solution_found = apply_production_rules(board, max_tier=myoptions['max_tier'], very_verbose=myoptions['very_verbose'])
+    return annotate_solve(board, solution_found)
+
 
 if __name__ == '__main__':
     # puzzle_str = '..32.......3...........1......3....4......4.2......43..3..................33..1..' # easy
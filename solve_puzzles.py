@@ -8,7 +8,9 @@ import time
 import argparse
 from draw_limesudoku import draw_puzzle
 import importlib
+from concurrent.futures import ThreadPoolExecutor
 from puzzle_record import PuzzleRecord
+from puzzle_store import is_puzzle_store, PuzzleStore
 
 parser = argparse.ArgumentParser(description='Solve puzzles from a test suite file.')
 parser.add_argument('filename', type=str, help='Path to the test suite file')
@@ -23,7 +25,8 @@ parser.add_argument('-du', '--draw_unsolved', action='store_true', help='Draw th
 parser.add_argument('-ds', '--draw_steps', action='store_true', help='Draw the solution steps')
 parser.add_argument('-bd', '--bestiary_draw', action='store_true', help='Bestiary drawing style for -ds (before/after steps)')
 parser.add_argument('-ia', '--inhibit_annotations', action='store_true', help='Do not include text labels in drawings')
-parser.add_argument('-s', '--solver', type=str, default='PR', choices=['OR', 'PR'], help='Solver to use (%(choices)s) (default: %(default)s)')
+parser.add_argument('-s', '--solver', type=str, default='PR', choices=['OR', 'PR', 'BM'], help='Solver to use (%(choices)s) (default: %(default)s)')
+parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of puzzles to solve concurrently, OR solver only (default: %(default)s)')
 parser.add_argument('-pp', '--print_puzzles', action='store_true', help='Print the solved puzzles')
 parser.add_argument('-p', '--print_unsolved', action='store_true', help='Print the unsolved puzzles')
 parser.add_argument('-maxt', '--max_tier', type=int, 
@@ -35,6 +38,10 @@ if args.draw_steps and args.number_to_solve != 1:
     print("ERROR: -ds is only supported for a single puzzle, use -n 1")
     sys.exit(1)
 
+if args.jobs > 1 and args.solver != 'OR':
+    print("ERROR: -j is only supported for OR solver")
+    sys.exit(1)
+
 if args.very_verbose:
     args.verbose = True
 
@@ -54,6 +61,8 @@ def read_puzzles_from_file(filename):
     puzzles = []
     
     try:
+        if is_puzzle_store(filename):
+            return PuzzleStore(filename).puzzles()
         with open(filename, 'r') as file:
             for line_num, line in enumerate(file, 1):
                 line = line.strip()
@@ -97,10 +106,33 @@ def solve_puzzles_from_file(filename):
     nbr_encountered = 0
     branches_encountered = 0
 
+    # extra -abc seeds are solved concurrently (CP-SAT releases the GIL while it searches),
+    # each with a single CP-SAT worker, as in solve_OR.solve_batch
+    abc_seeds = range(1,5)
+    abc_executor = ThreadPoolExecutor(max_workers=len(abc_seeds)) if args.average_branch_count else None
+
+    solve_options = {'draw_steps':args.draw_steps, 
+                     'bestiary_draw':args.bestiary_draw,
+                     'inhibit_annotations':args.inhibit_annotations,
+                     'verbose':args.verbose, 
+                     'very_verbose': args.very_verbose,
+                     'max_tier':args.max_tier, 
+                     'draw_unsolved':args.draw_unsolved}
+    if args.average_branch_count:
+        # branch counts depend on the number of CP-SAT workers, so every -abc sample uses one
+        solve_options['num_workers'] = 1
+
     start_time = time.perf_counter()
+    batch_results = None
+    if args.jobs > 1:
+        # results come back in order, so the loop below consumes them as it goes
+        selected = puzzles[args.puzzle_offset-1:]
+        if args.number_to_solve:
+            selected = selected[:args.number_to_solve]
+        batch_results = solver_module.solve_batch(selected, solve_options, threads=args.jobs)
+
     for i, puzrec in enumerate(puzzles, 1):
         puzzle_str = puzrec.clues_string
-        annotations = puzrec.annotations
         answer_str = puzrec.answer_string
         nom = puzrec.nom
         ptype = puzrec.puzzle_type
@@ -116,18 +148,15 @@ def solve_puzzles_from_file(filename):
 
         nbr_encountered += 1
         
-        answer,stats = solve(puzrec, options={'draw_steps':args.draw_steps, 
-                                    'bestiary_draw':args.bestiary_draw,
-                                    'inhibit_annotations':args.inhibit_annotations,
-                                    'verbose':args.verbose, 
-                                    'very_verbose': args.very_verbose,
-                                    'max_tier':args.max_tier, 
-                                    'draw_unsolved':args.draw_unsolved})
+        if batch_results:
+            _,answer,stats = next(batch_results)
+        else:
+            answer,stats = solve(puzrec, options=solve_options)
 
         if answer is None:
             print(f"ERROR: no answer found for puzzle {i}")
             print(f"  Puzzle: {puzzle_str}")
-            print(f"  Annotations: {annotations}")
+            print(f"  Annotations: {puzrec.annotations}")
             sys.exit(1)
 
         if len(answer) == 81:
@@ -144,14 +173,14 @@ def solve_puzzles_from_file(filename):
                 if args.solver != 'OR':
                     print("ERROR: average_branch_count is only supported for OR solver")
                     sys.exit(1)
-                tot_solved = 1
-                tot_branch_count = stats['branches']
-                for r in range(1,5):
-                    _,stats = solve(puzzle_str, options={'rand_seed':r})
-                    tot_solved += 1
-                    tot_branch_count += stats['branches']
-                avg_branch_count = tot_branch_count / tot_solved
+                seed_results = abc_executor.map(lambda r: solve(puzrec, options={'rand_seed':r, 'num_workers':1}), abc_seeds)
+                branch_counts = [stats['branches']] + [seed_stats['branches'] for _,seed_stats in seed_results]
+                avg_branch_count = sum(branch_counts) / len(branch_counts)
+                branch_count_variance = sum((b - avg_branch_count)**2 for b in branch_counts) / len(branch_counts)
                 stats['abc'] = avg_branch_count
+                stats['abc_variance'] = branch_count_variance
+                puzrec.add_annotation('abc', round(avg_branch_count, 1))
+                puzrec.add_annotation('abc_variance', round(branch_count_variance, 1))
 
             if args.draw_puzzle:
                 print("drawing puzzle ", puzzle_str)
@@ -171,6 +200,9 @@ def solve_puzzles_from_file(filename):
         if args.number_to_solve and nbr_encountered >= args.number_to_solve:
             break
 
+    if abc_executor:
+        abc_executor.shutdown()
+
     end_time = time.perf_counter()
     elapsed_microseconds = int((end_time - start_time) * 1_000_000)
     print(f"# {nbr_solved}/{len(puzzles)} puzzles solved in {elapsed_microseconds/1000000:.3f} seconds.")